@@ -0,0 +1,52 @@
+import threading
+from bisect import bisect_left
+
+from recipes.models import Ingredient
+from .cache import ingredient_cache
+
+
+class IngredientIndex:
+    """Индекс названий ингредиентов для автодополнения.
+
+    Названия в casefold хранятся отсортированными: совпадения по префиксу
+    находятся двоичным поиском, по подстроке - проходом по списку в памяти.
+    Индекс строится при первом поиске и перестраивается, когда меняется
+    версия справочника ингредиентов в ingredient_cache.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.keys = []
+        self.ids = []
+        self.lock = threading.Lock()
+
+    def ensure_built(self):
+        version = ingredient_cache.get_version()
+        if version == self.version:
+            return
+        with self.lock:
+            if version == self.version:
+                return
+            rows = sorted(
+                (name.casefold(), pk)
+                for pk, name in Ingredient.objects.values_list('pk', 'name'))
+            self.keys = [key for key, _ in rows]
+            self.ids = [pk for _, pk in rows]
+            self.version = version
+
+    def search(self, query):
+        """Возвращает id совпадений по префиксу и по подстроке"""
+        self.ensure_built()
+        keys, ids = self.keys, self.ids
+        query = query.strip().casefold()
+        start = bisect_left(keys, query)
+        end = bisect_left(keys, query + '\U0010ffff', lo=start)
+        prefix_ids = ids[start:end]
+        substring_ids = [
+            pk for key, pk in zip(keys, ids)
+            if query in key and not key.startswith(query)
+        ]
+        return prefix_ids, substring_ids
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,212 @@
+"""Сценарий запросов ко всем маршрутам API с бюджетами запросов к БД.
+
+Сценарий выполняется по порядку: запросы, которые меняют данные, идут
+парами (добавить/удалить), поэтому его можно повторять на одном наборе
+данных. Используется тестами бюджетов и командой benchmark_api.
+"""
+import base64
+import time
+from http import HTTPStatus
+from io import BytesIO
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+
+from recipes.models import Favorite, Follow, ShoppingCart, Tag
+from .factories import PASSWORD
+
+
+def get_image():
+    file = BytesIO()
+    Image.new('RGB', (4, 4), 'red').save(file, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        file.getvalue()).decode()
+
+
+class Endpoint:
+    """Запрос сценария.
+
+    path и data - строки/словари с подстановками из контекста сценария
+    либо функции от контекста. budget - допустимое число запросов к БД,
+    которое не должно зависеть от размера страницы (paginated).
+    """
+
+    def __init__(self, route, method, path, budget, data=None,
+                 anonymous=False, paginated=False, after=None, status=None):
+        self.route = route
+        self.method = method
+        self.path = path
+        self.budget = budget
+        self.data = data
+        self.anonymous = anonymous
+        self.paginated = paginated
+        self.after = after
+        self.status = status
+
+    @property
+    def name(self):
+        if self.anonymous:
+            return f'{self.method} {self.path} (anonymous)'
+        return f'{self.method} {self.path}'
+
+    def get_path(self, context, limit=None):
+        path = self.path.format(**context)
+        if self.paginated and limit:
+            path += ('&' if '?' in path else '?') + f'limit={limit}'
+        return path
+
+    def get_data(self, context):
+        if callable(self.data):
+            return self.data(context)
+        return self.data
+
+    def request(self, client, context, limit=None):
+        """Выполняет запрос, возвращает (ответ, число запросов, время)"""
+        client.force_authenticate(None if self.anonymous
+                                  else context['viewer'])
+        started = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(client, self.method.lower())(
+                self.get_path(context, limit),
+                self.get_data(context),
+                format='json')
+            if response.streaming:
+                b''.join(response.streaming_content)
+        elapsed = time.perf_counter() - started
+        if self.after is not None:
+            self.after(context, response)
+        return response, len(queries), elapsed
+
+
+def get_context(dataset):
+    viewer = dataset.viewer
+    followed = set(Follow.objects.filter(user=viewer).values_list(
+        'following_id', flat=True))
+    used = set(Favorite.objects.filter(user=viewer).values_list(
+        'recipe_id', flat=True)) | set(ShoppingCart.objects.filter(
+            user=viewer).values_list('recipe_id', flat=True))
+    return {
+        'viewer': viewer,
+        'n': 0,
+        'password': PASSWORD,
+        'image': get_image(),
+        'author': next(iter(followed)),
+        'free_author': next(user_id for user_id in dataset.user_ids
+                            if user_id not in followed
+                            and user_id != viewer.pk),
+        'recipe': dataset.recipe_ids[0],
+        'free_recipe': next(recipe_id for recipe_id in dataset.recipe_ids
+                            if recipe_id not in used),
+        'own_recipe': None,
+        'ingredients': dataset.ingredient_ids[:3],
+        'ingredient': dataset.ingredient_ids[0],
+        'tag': dataset.tag_slugs[0],
+        'tag_id': Tag.objects.get(slug=dataset.tag_slugs[0]).pk,
+        'tag_ids': list(Tag.objects.values_list('pk', flat=True)[:2]),
+    }
+
+
+def remember_recipe(context, response):
+    context['own_recipe'] = response.data['id']
+
+
+def change_password(context, response):
+    context['password'] = context['new_password']
+
+
+def new_user(context):
+    context['n'] += 1
+    number = f'{context["viewer"].pk}x{context["n"]}'
+    return {'email': f'new{number}@foodgram.ru',
+            'username': f'new{number}',
+            'first_name': 'Новый',
+            'last_name': 'Пользователь',
+            'password': PASSWORD}
+
+
+def new_password(context):
+    context['new_password'] = f'Secret-{context["n"]}-{time.time_ns()}'
+    return {'current_password': context['password'],
+            'new_password': context['new_password']}
+
+
+def recipe_data(context):
+    return {'ingredients': [{'id': ingredient_id, 'amount': 10}
+                            for ingredient_id in context['ingredients']],
+            'tags': context['tag_ids'],
+            'image': context['image'],
+            'name': 'Новый рецепт',
+            'text': 'Описание',
+            'cooking_time': 15}
+
+
+def credentials(context):
+    return {'email': context['viewer'].email,
+            'password': context['password']}
+
+
+ENDPOINTS = (
+    Endpoint('api-root', 'GET', '/api/', 0, anonymous=True,
+             status=HTTPStatus.UNAUTHORIZED),
+    Endpoint('users-list', 'GET', '/api/users/', 3, paginated=True),
+    Endpoint('users-list', 'POST', '/api/users/', 4, data=new_user,
+             anonymous=True),
+    Endpoint('users-detail', 'GET', '/api/users/{author}/', 1),
+    Endpoint('users-me', 'GET', '/api/users/me/', 1),
+    Endpoint('users-set-password', 'POST', '/api/users/set_password/', 1,
+             data=new_password, after=change_password),
+    Endpoint('users-subscriptions', 'GET', '/api/users/subscriptions/', 3,
+             paginated=True),
+    Endpoint('users-subscribe', 'POST', '/api/users/{free_author}/subscribe/',
+             9),
+    Endpoint('users-subscribe', 'DELETE',
+             '/api/users/{free_author}/subscribe/', 6),
+    Endpoint('ingredient-list', 'GET', '/api/ingredients/', 1,
+             anonymous=True),
+    Endpoint('ingredient-list', 'GET', '/api/ingredients/?name=ингр', 2,
+             anonymous=True),
+    Endpoint('ingredient-detail', 'GET', '/api/ingredients/{ingredient}/',
+             1, anonymous=True),
+    Endpoint('tag-list', 'GET', '/api/tags/', 1, anonymous=True),
+    Endpoint('tag-detail', 'GET', '/api/tags/{tag_id}/', 1,
+             anonymous=True),
+    Endpoint('recipe-list', 'GET', '/api/recipes/', 5, anonymous=True,
+             paginated=True),
+    Endpoint('recipe-list', 'GET', '/api/recipes/', 8, paginated=True),
+    Endpoint('recipe-list', 'GET',
+             '/api/recipes/?tags={tag}&is_favorited=1', 6, paginated=True),
+    Endpoint('recipe-list', 'GET', '/api/recipes/?search=рецепт', 5,
+             paginated=True),
+    Endpoint('recipe-list', 'GET', '/api/recipes/?ordering=trending', 5,
+             paginated=True),
+    Endpoint('recipe-list', 'GET', '/api/recipes/?pagination=cursor', 4,
+             paginated=True),
+    Endpoint('recipe-feed', 'GET', '/api/recipes/feed/', 6, paginated=True),
+    Endpoint('recipe-pantry', 'GET',
+             '/api/recipes/pantry/?ingredients={ingredient}', 6,
+             paginated=True),
+    Endpoint('recipe-list', 'POST', '/api/recipes/', 22, data=recipe_data,
+             after=remember_recipe),
+    Endpoint('recipe-detail', 'GET', '/api/recipes/{recipe}/', 3),
+    Endpoint('recipe-similar', 'GET', '/api/recipes/{recipe}/similar/', 2,
+             anonymous=True),
+    Endpoint('recipe-detail', 'PATCH', '/api/recipes/{own_recipe}/', 15,
+             data=recipe_data),
+    Endpoint('recipe-favorite', 'POST', '/api/recipes/{free_recipe}/favorite/',
+             8),
+    Endpoint('recipe-favorite', 'DELETE',
+             '/api/recipes/{free_recipe}/favorite/', 6),
+    Endpoint('recipe-shopping-cart', 'POST',
+             '/api/recipes/{free_recipe}/shopping_cart/', 14),
+    Endpoint('recipe-shopping-cart', 'DELETE',
+             '/api/recipes/{free_recipe}/shopping_cart/', 12),
+    Endpoint('recipe-download-shopping-cart', 'GET',
+             '/api/recipes/download_shopping_cart/', 1),
+    Endpoint('recipe-detail', 'DELETE', '/api/recipes/{own_recipe}/', 15),
+    Endpoint('create_token', 'POST', '/api/auth/token/login/', 6,
+             data=credentials, anonymous=True),
+    Endpoint('login', 'POST', '/api/auth/token/login', 3,
+             data=credentials, anonymous=True),
+    Endpoint('logout', 'POST', '/api/auth/token/logout/', 1),
+)
@@ -0,0 +1,116 @@
+"""Фабрики наборов данных для тестов и бенчмарков API"""
+import random
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+
+from recipes.feed import rebuild_feed
+from recipes.models import (Favorite, Follow, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from recipes.scores import refresh_recipe_scores
+from recipes.search import refresh_search_documents
+from recipes.services import (rebuild_shopping_cart_ingredients,
+                              reconcile_counters)
+from recipes.similarity import build_similarities
+
+User = get_user_model()
+
+PASSWORD = 'Secret-0-pass'
+BATCH_SIZE = 1000
+
+
+class Dataset:
+    """Созданный набор данных: id объектов и пользователь-зритель"""
+
+    def __init__(self, viewer, user_ids, recipe_ids, ingredient_ids,
+                 tag_slugs):
+        self.viewer = viewer
+        self.user_ids = user_ids
+        self.recipe_ids = recipe_ids
+        self.ingredient_ids = ingredient_ids
+        self.tag_slugs = tag_slugs
+
+
+def create_users(count, prefix='user'):
+    password = make_password(PASSWORD)
+    start = User.objects.count()
+    User.objects.bulk_create(
+        (User(username=f'{prefix}{number}',
+              email=f'{prefix}{number}@foodgram.ru',
+              first_name=f'Имя{number}',
+              last_name=f'Фамилия{number}',
+              password=password)
+         for number in range(start, start + count)),
+        batch_size=BATCH_SIZE)
+    return list(User.objects.order_by('-pk').values_list(
+        'pk', flat=True)[:count])[::-1]
+
+
+def create_dataset(users=50, recipes=100, ingredients=200, tags=5,
+                   ingredients_per_recipe=8, follows=10, favorites=10,
+                   carts=5, seed=0):
+    """Создает связанный набор данных через bulk_create.
+
+    follows, favorites и carts - количество подписок, избранных рецептов
+    и рецептов в Списке покупок на каждого пользователя.
+    """
+    rnd = random.Random(seed)
+    user_ids = create_users(users)
+    Tag.objects.bulk_create(
+        Tag(name=f'Тэг {number}', slug=f'tag{number}',
+            color=f'#{number:06X}')
+        for number in range(tags))
+    tag_ids = list(Tag.objects.values_list('pk', flat=True))
+    Ingredient.objects.bulk_create(
+        (Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+         for number in range(ingredients)),
+        batch_size=BATCH_SIZE)
+    ingredient_ids = list(Ingredient.objects.values_list('pk', flat=True))
+    Recipe.objects.bulk_create(
+        (Recipe(author_id=rnd.choice(user_ids),
+                name=f'Рецепт {number}',
+                text=f'Описание рецепта {number}',
+                cooking_time=rnd.randint(1, 120),
+                image='recipes/images/temp.png')
+         for number in range(recipes)),
+        batch_size=BATCH_SIZE)
+    recipe_ids = list(Recipe.objects.values_list('pk', flat=True))
+    RecipeIngredient.objects.bulk_create(
+        (RecipeIngredient(recipe_id=recipe_id,
+                          ingredient_id=ingredient_id,
+                          amount=rnd.randint(1, 500))
+         for recipe_id in recipe_ids
+         for ingredient_id in rnd.sample(
+             ingredient_ids, min(ingredients_per_recipe,
+                                 len(ingredient_ids)))),
+        batch_size=BATCH_SIZE)
+    Recipe.tags.through.objects.bulk_create(
+        (Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+         for recipe_id in recipe_ids
+         for tag_id in rnd.sample(tag_ids, rnd.randint(1, len(tag_ids)))),
+        batch_size=BATCH_SIZE)
+    Follow.objects.bulk_create(
+        (Follow(user_id=user_id, following_id=following_id)
+         for user_id in user_ids
+         for following_id in rnd.sample(user_ids, min(follows + 1, users))
+         if following_id != user_id),
+        batch_size=BATCH_SIZE, ignore_conflicts=True)
+    for model, per_user in ((Favorite, favorites), (ShoppingCart, carts)):
+        model.objects.bulk_create(
+            (model(user_id=user_id, recipe_id=recipe_id)
+             for user_id in user_ids
+             for recipe_id in rnd.sample(recipe_ids,
+                                         min(per_user, len(recipe_ids)))),
+            batch_size=BATCH_SIZE)
+    rebuild_shopping_cart_ingredients()
+    reconcile_counters()
+    rebuild_feed()
+    refresh_recipe_scores()
+    build_similarities()
+    for start in range(0, len(recipe_ids), BATCH_SIZE):
+        refresh_search_documents(recipe_ids[start:start + BATCH_SIZE])
+    return Dataset(viewer=User.objects.get(pk=user_ids[0]),
+                   user_ids=user_ids,
+                   recipe_ids=recipe_ids,
+                   ingredient_ids=ingredient_ids,
+                   tag_slugs=list(Tag.objects.values_list('slug', flat=True)))
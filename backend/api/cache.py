@@ -0,0 +1,141 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class VersionedCache:
+    """Версия данных в общем кэше, которую сбрасывают сигналы"""
+    prefix = 'catalog'
+
+    def __init__(self, name):
+        self.name = name
+
+    @property
+    def version_key(self):
+        return f'{self.prefix}:{self.name}:version'
+
+    def get_version(self):
+        """Версия - время последнего изменения в нс"""
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, time.time_ns(), None)
+            version = cache.get(self.version_key)
+        return version
+
+    def invalidate(self):
+        cache.set(self.version_key, time.time_ns(), None)
+
+
+class CatalogCache(VersionedCache):
+    """Кэш ответов справочника (ингредиенты, тэги).
+
+    Перед общим кэшем Django стоит LRU-кэш процесса. Ключи включают
+    версию справочника, поэтому для сброса достаточно сменить версию:
+    старые записи перестают читаться и вытесняются сами.
+    """
+
+    def __init__(self, name, maxsize=None):
+        super().__init__(name)
+        self.maxsize = maxsize or settings.CATALOG_LOCAL_CACHE_SIZE
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key, build):
+        """Возвращает (данные, версия), вызывая build() при промахе"""
+        version = self.get_version()
+        local_key = (version, key)
+        with self.lock:
+            if local_key in self.local:
+                self.local.move_to_end(local_key)
+                return self.local[local_key], version
+        shared_key = 'catalog:{}:{}:{}'.format(
+            self.name, version, hashlib.md5(key.encode()).hexdigest())
+        data = cache.get(shared_key)
+        if data is None:
+            data = build()
+            cache.set(shared_key, data, settings.CATALOG_CACHE_TIMEOUT)
+        with self.lock:
+            self.local[local_key] = data
+            while len(self.local) > self.maxsize:
+                self.local.popitem(last=False)
+        return data, version
+
+
+class ResponseCache(VersionedCache):
+    """Кэш целых ответов API с поколением и stale-while-revalidate.
+
+    Запись хранит поколение, в котором построена. После смены поколения
+    устаревшая запись еще RESPONSE_CACHE_STALE_TIMEOUT секунд отдается
+    всем запросам, кроме одного, который ее перестраивает. Исходы
+    обращений (hit, stale, miss) считаются для метрики доли попаданий.
+    """
+    prefix = 'responses'
+    outcomes = ('hit', 'stale', 'miss')
+
+    def get_key(self, key):
+        return '{}:{}:{}'.format(self.prefix, self.name,
+                                 hashlib.md5(key.encode()).hexdigest())
+
+    def get(self, key, build):
+        """Возвращает (данные, поколение), вызывая build() при промахе.
+
+        Если build() вернул None, ответ не кэшируется.
+        """
+        version = self.get_version()
+        shared_key = self.get_key(key)
+        entry = cache.get(shared_key)
+        lock_key = None
+        if entry is not None:
+            entry_version, data = entry
+            if entry_version == version:
+                self.count('hit')
+                return data, entry_version
+            stale_timeout = settings.RESPONSE_CACHE_STALE_TIMEOUT
+            if time.time_ns() - version < stale_timeout * 10 ** 9:
+                lock_key = f'{shared_key}:lock'
+                if not cache.add(lock_key, True, stale_timeout):
+                    self.count('stale')
+                    return data, entry_version
+        self.count('miss')
+        try:
+            data = build()
+            if data is not None:
+                cache.set(shared_key, (version, data),
+                          settings.RESPONSE_CACHE_TIMEOUT)
+        finally:
+            if lock_key is not None:
+                cache.delete(lock_key)
+        return data, version
+
+    def get_stats_key(self, outcome):
+        return f'{self.prefix}:{self.name}:stats:{outcome}'
+
+    def count(self, outcome):
+        key = self.get_stats_key(outcome)
+        if not cache.add(key, 1, None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                cache.add(key, 1, None)
+
+    def get_stats(self):
+        """Счетчики исходов {hit, stale, miss}"""
+        values = cache.get_many(
+            [self.get_stats_key(outcome) for outcome in self.outcomes])
+        return {outcome: values.get(self.get_stats_key(outcome), 0)
+                for outcome in self.outcomes}
+
+    def reset_stats(self):
+        cache.delete_many(
+            [self.get_stats_key(outcome) for outcome in self.outcomes])
+
+
+ingredient_cache = CatalogCache('ingredients')
+tag_cache = CatalogCache('tags')
+# Версия состава рецептов для индексов в памяти процесса.
+recipe_ingredients_cache = VersionedCache('recipe_ingredients')
+recipe_response_cache = ResponseCache('recipes')
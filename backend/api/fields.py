@@ -1,15 +1,175 @@
 import base64
+import binascii
+from collections.abc import Mapping
+from tempfile import SpooledTemporaryFile
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, UnidentifiedImageError
 from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+from recipes.models import Recipe
+
+DECODE_CHUNK_SIZE = 64 * 1024
 
 
 class Base64ImageField(serializers.ImageField):
     """Поле сериализатора картинок в base64"""
 
+    default_error_messages = {
+        **serializers.ImageField.default_error_messages,
+        'too_large': 'Картинка больше допустимых {width}x{height} '
+                     'или {pixels} пикселей.',
+    }
+
+    def decode(self, imgstr):
+        """Декодирует base64 по частям во временный файл"""
+        file = SpooledTemporaryFile(
+            max_size=settings.IMAGE_UPLOAD_SPOOL_SIZE)
+        try:
+            for start in range(0, len(imgstr), DECODE_CHUNK_SIZE):
+                file.write(base64.b64decode(
+                    imgstr[start:start + DECODE_CHUNK_SIZE], validate=True))
+        except (binascii.Error, ValueError):
+            file.close()
+            self.fail('invalid_image')
+        size = file.tell()
+        file.seek(0)
+        return file, size
+
+    def validate_dimensions(self, file):
+        """Проверяет размеры по заголовку, не декодируя картинку"""
+        try:
+            with Image.open(file) as image:
+                width, height = image.size
+        except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+            self.fail('invalid_image')
+        finally:
+            file.seek(0)
+        max_side = settings.IMAGE_UPLOAD_MAX_SIDE
+        max_pixels = settings.IMAGE_UPLOAD_MAX_PIXELS
+        if (max(width, height) > max_side
+                or width * height > max_pixels):
+            self.fail('too_large', width=max_side, height=max_side,
+                      pixels=max_pixels)
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            file, size = self.decode(imgstr)
+            self.validate_dimensions(file)
+            data = UploadedFile(file, name='temp.' + ext,
+                                content_type=format[len('data:'):],
+                                size=size)
         return super().to_internal_value(data)
+
+
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные копии картинки: {размер: {формат: url}}"""
+
+    def to_representation(self, value):
+        storage = Recipe._meta.get_field('image').storage
+        request = self.context.get('request')
+        representation = {}
+        for variant, names in (value or {}).items():
+            representation[variant] = {}
+            for extension, name in names.items():
+                url = storage.url(name)
+                if request is not None:
+                    url = request.build_absolute_uri(url)
+                representation[variant][extension] = url
+        return representation
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Список первичных ключей, проверяемый одним запросом in_bulk"""
+
+    default_error_messages = {
+        **serializers.ManyRelatedField.default_error_messages,
+        'does_not_exist': 'Объекты не существуют: {pk_values}.',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        pks = [self.child_relation.to_pk(item) for item in data]
+        objects = self.child_relation.get_queryset().in_bulk(set(pks))
+        missing = [pk for pk in pks if pk not in objects]
+        if missing:
+            self.fail('does_not_exist',
+                      pk_values=', '.join(map(str, missing)))
+        return [objects[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """PrimaryKeyRelatedField, проверяющий ключи пачкой.
+
+    С many=True весь список проверяется одним запросом in_bulk. Внутри
+    BulkListSerializer поле берет объекты, заранее загруженные списком.
+    """
+
+    objects = None
+
+    def to_pk(self, item):
+        if self.pk_field is not None:
+            item = self.pk_field.to_internal_value(item)
+        try:
+            if isinstance(item, bool):
+                raise TypeError
+            return int(item)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(item).__name__)
+
+    def to_internal_value(self, data):
+        if self.objects is None:
+            return super().to_internal_value(data)
+        pk = self.to_pk(data)
+        if pk not in self.objects:
+            self.fail('does_not_exist', pk_value=pk)
+        return self.objects[pk]
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+
+class BulkListSerializer(serializers.ListSerializer):
+    """Список вложенных объектов с ключами BulkPrimaryKeyRelatedField.
+
+    Ключи каждого такого поля проверяются одним запросом на весь список.
+    """
+
+    def get_bulk_fields(self):
+        return [field for field in self.child.fields.values()
+                if isinstance(field, BulkPrimaryKeyRelatedField)
+                and not field.read_only]
+
+    def load_objects(self, field, data):
+        pks = set()
+        for item in data:
+            if isinstance(item, Mapping) and field.field_name in item:
+                try:
+                    pks.add(field.to_pk(item[field.field_name]))
+                except ValidationError:
+                    continue
+        field.objects = field.get_queryset().in_bulk(pks)
+
+    def to_internal_value(self, data):
+        fields = self.get_bulk_fields()
+        if isinstance(data, list):
+            for field in fields:
+                self.load_objects(field, data)
+        try:
+            return super().to_internal_value(data)
+        finally:
+            for field in fields:
+                field.objects = None
@@ -1,34 +1,94 @@
+from django.conf import settings
+from django.db.models import Case, Exists, F, OuterRef, Value, When
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredient, Recipe
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.search import search_recipes
+from .autocomplete import ingredient_index
+from .cache import tag_cache
 
 
 class IngredientFilter(FilterSet):
-    name = filters.CharFilter(lookup_expr='istartswith')
+    name = filters.CharFilter(method='filter_name')
 
     class Meta:
         model = Ingredient
         fields = ('name',)
 
+    def filter_name(self, queryset, name, value):
+        prefix_ids, substring_ids = ingredient_index.search(value)
+        ids = (prefix_ids + substring_ids)[:settings.INGREDIENT_SEARCH_LIMIT]
+        if not ids:
+            return queryset.none()
+        return queryset.filter(pk__in=ids).order_by(Case(
+            *(When(pk=pk, then=Value(position))
+              for position, pk in enumerate(ids))))
+
+
+def get_tag_ids_by_slug():
+    """Словарь {slug: id} из закэшированного справочника тэгов"""
+    tag_ids, _ = tag_cache.get(
+        'tag_ids_by_slug', lambda: dict(Tag.objects.values_list('slug', 'pk')))
+    return tag_ids
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tag_ids_by_slug()]
+
+
+RECIPE_ORDERING = {
+    'favorites': 'favorites',
+    'shopping_cart': 'shopping_carts',
+    'trending': 'trending',
+}
+
 
 class RecipeFilter(FilterSet):
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart')
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    tags = filters.MultipleChoiceFilter(choices=get_tag_choices,
+                                        method='filter_tags')
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=[(name, name) for name in RECIPE_ORDERING],
+        method='filter_ordering')
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags__slug')
+        fields = ('author',)
+
+    def filter_tags(self, queryset, name, value):
+        tag_ids = get_tag_ids_by_slug()
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'),
+            tag_id__in=[tag_ids[slug] for slug in value])))
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        """Сортировка по оценкам из RecipeScore, при равенстве - новые.
+
+        Оценки есть у каждого рецепта: соединение внутреннее, порядок
+        совпадает с индексом (-оценка, -pub_date, -recipe).
+        """
+        return queryset.filter(score__isnull=False).order_by(
+            F(f'score__{RECIPE_ORDERING[value]}').desc(),
+            F('score__pub_date').desc(),
+            F('score__recipe').desc())
+
+    def filter_by_user_relation(self, queryset, model, value):
+        """Рецепты, которые есть (или нет) у пользователя в model"""
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.none() if value else queryset
+        relation = Exists(model.objects.filter(user=user,
+                                               recipe=OuterRef('pk')))
+        return queryset.filter(relation if value else ~relation)
 
     def filter_is_favorited(self, queryset, name, value):
-        if self.request.user.is_authenticated:
-            return queryset.filter(
-                favorite_for_users__user=self.request.user).all()
-        return queryset
+        return self.filter_by_user_relation(queryset, Favorite, value)
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
-        if self.request.user.is_authenticated:
-            return queryset.filter(
-                in_shoppingcart_for_users__user=self.request.user).all()
-        return queryset
+        return self.filter_by_user_relation(queryset, ShoppingCart, value)
@@ -0,0 +1,52 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.autocomplete import ingredient_index
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = ('Бенчмарк автодополнения ингредиентов: задержка на каждое '
+            'нажатие клавиши')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--words', type=int, default=200,
+                            help='Сколько названий "набрать" посимвольно')
+        parser.add_argument('--compare-db', action='store_true',
+                            help='Замерить также поиск istartswith в БД')
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            raise CommandError('Справочник пуст, запустите '
+                               'ingredients_upload_db')
+        words = random.sample(names, min(options['words'], len(names)))
+        keystrokes = [word[:length] for word in words
+                      for length in range(1, len(word) + 1)]
+        started = time.perf_counter()
+        ingredient_index.ensure_built()
+        self.stdout.write(
+            f'Построение индекса ({len(names)} названий): '
+            f'{(time.perf_counter() - started) * 1000:.1f} мс')
+        self.report('Индекс', keystrokes, ingredient_index.search)
+        if options['compare_db']:
+            self.report(
+                'БД istartswith', keystrokes,
+                lambda query: list(Ingredient.objects.filter(
+                    name__istartswith=query).values_list('pk', flat=True)))
+
+    def report(self, title, keystrokes, search):
+        timings = []
+        for query in keystrokes:
+            started = time.perf_counter()
+            search(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        self.stdout.write(self.style.SUCCESS(
+            f'{title}: нажатий {len(timings)}, '
+            f'p50 {statistics.median(timings):.3f} мс, '
+            f'p95 {timings[int(len(timings) * 0.95) - 1]:.3f} мс, '
+            f'max {timings[-1]:.3f} мс'))
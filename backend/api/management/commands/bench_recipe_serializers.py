@@ -0,0 +1,98 @@
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.benchmarks.factories import create_dataset
+from api.row_serializers import RECIPE_FIELDS, RecipeRowSerializer
+from api.serializers import RecipeSerializer
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Бенчмарк вывода страницы рецептов: RecipeSerializer против '
+            'RecipeRowSerializer на значениях values(). Данные создаются '
+            'в отдельной тестовой базе')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--ingredients', type=int, default=1000)
+        parser.add_argument('--page-size', type=int, default=100,
+                            help='Рецептов на странице')
+        parser.add_argument('--repeat', type=int, default=50,
+                            help='Сколько раз вывести страницу')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        media_root = tempfile.mkdtemp()
+        try:
+            with override_settings(MEDIA_ROOT=media_root):
+                self.run_benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+
+    def run_benchmark(self, options):
+        self.stdout.write('Создание набора данных...')
+        dataset = create_dataset(users=options['users'],
+                                 recipes=options['recipes'],
+                                 ingredients=options['ingredients'])
+        factory = APIRequestFactory()
+        user = dataset.viewer
+        size = options['page_size']
+        ordering = ('-pub_date', '-id')
+
+        def serialize_models(request):
+            recipes = Recipe.objects.with_relations().order_by(*ordering)
+            return RecipeSerializer(recipes[:size], many=True,
+                                    context={'request': request}).data
+
+        def serialize_rows(request):
+            rows = Recipe.objects.values(*RECIPE_FIELDS).order_by(*ordering)
+            return RecipeRowSerializer(rows[:size], many=True,
+                                       context={'request': request}).data
+
+        def measure(serialize):
+            timings = []
+            for _ in range(options['repeat']):
+                http_request = factory.get('/api/recipes/')
+                force_authenticate(http_request, user)
+                request = Request(http_request)
+                started = time.perf_counter()
+                content = JSONRenderer().render(serialize(request))
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            return content, timings
+
+        results = {}
+        for name, serialize in (('RecipeSerializer', serialize_models),
+                                ('RecipeRowSerializer', serialize_rows)):
+            cache.clear()
+            measure(serialize)
+            results[name] = measure(serialize)
+        for name, (_, timings) in results.items():
+            self.stdout.write(self.style.SUCCESS(
+                f'{name}: {size} рецептов, '
+                f'p50 {statistics.median(timings):.2f} мс, '
+                f'p95 {timings[max(int(len(timings) * 0.95) - 1, 0)]:.2f} '
+                f'мс'))
+        (models_content, models_timings), (rows_content, rows_timings) = (
+            results.values())
+        speedup = (statistics.median(models_timings)
+                   / statistics.median(rows_timings))
+        self.stdout.write(self.style.SUCCESS(f'Ускорение: {speedup:.1f}x'))
+        if models_content != rows_content:
+            raise CommandError('Вывод сериализаторов различается')
@@ -0,0 +1,74 @@
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from recipes.similarity import CHUNK_SIZE, build_matrix, iter_neighbours
+
+
+class Command(BaseCommand):
+    help = ('Бенчмарк похожих рецептов на синтетическом каталоге: '
+            'полный пересчет и запрос соседей одного рецепта')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000,
+                            help='Количество рецептов')
+        parser.add_argument('--ingredients', type=int, default=2000,
+                            help='Размер справочника ингредиентов')
+        parser.add_argument('--per-recipe', type=int, default=10,
+                            help='Среднее число ингредиентов в рецепте')
+        parser.add_argument('--top-k', type=int, default=10,
+                            help='Количество соседей рецепта')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                            help='Количество строк, перемножаемых за раз')
+        parser.add_argument('--max-df', type=float,
+                            help='Доля рецептов, начиная с которой '
+                                 'ингредиент не учитывается, по умолчанию '
+                                 'SIMILAR_RECIPES_MAX_DF')
+        parser.add_argument('--queries', type=int, default=200,
+                            help='Сколько раз замерить соседей одного '
+                                 'рецепта')
+
+    def handle(self, *args, **options):
+        generator = np.random.default_rng(0)
+        counts = generator.poisson(options['per_recipe'] - 1,
+                                   options['recipes']) + 1
+        # Популярность ингредиентов убывает по закону Ципфа.
+        weights = 1 / np.arange(1, options['ingredients'] + 1)
+        pairs = np.column_stack((
+            np.repeat(np.arange(options['recipes']), counts),
+            generator.choice(options['ingredients'], counts.sum(),
+                             p=weights / weights.sum()),
+        ))
+        pairs = np.unique(pairs, axis=0)
+        self.stdout.write(f'Рецептов: {options["recipes"]}, '
+                          f'связей с ингредиентами: {len(pairs)}')
+
+        started = time.perf_counter()
+        recipe_ids, _, matrix = build_matrix(pairs,
+                                             max_df=options['max_df'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Матрица TF-IDF: {time.perf_counter() - started:.2f} с'))
+
+        started = time.perf_counter()
+        rows = 0
+        for _ in iter_neighbours(matrix, np.arange(len(recipe_ids)),
+                                 options['top_k'], options['chunk_size']):
+            rows += 1
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Полный пересчет top-{options["top_k"]}: {elapsed:.2f} с '
+            f'({rows / elapsed:.0f} рецептов/с)'))
+
+        transposed = matrix.T.tocsr()
+        timings = []
+        for row in generator.choice(len(recipe_ids), options['queries']):
+            started = time.perf_counter()
+            next(iter_neighbours(matrix, [row], options['top_k'],
+                                 transposed=transposed))
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        self.stdout.write(self.style.SUCCESS(
+            f'Соседи одного рецепта: p50 {statistics.median(timings):.2f} '
+            f'мс, p95 {timings[int(len(timings) * 0.95) - 1]:.2f} мс'))
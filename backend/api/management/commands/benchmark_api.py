@@ -0,0 +1,101 @@
+import json
+import shutil
+import statistics
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import (override_settings, setup_test_environment,
+                               teardown_test_environment)
+from rest_framework.test import APIClient
+
+from api.benchmarks.endpoints import ENDPOINTS, get_context
+from api.benchmarks.factories import create_dataset
+
+
+class Command(BaseCommand):
+    help = ('Бенчмарк всех маршрутов API на сгенерированном наборе данных: '
+            'число запросов к БД и задержки p50/p95. Данные создаются '
+            'в отдельной тестовой базе')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--follows', type=int, default=30)
+        parser.add_argument('--favorites', type=int, default=30)
+        parser.add_argument('--carts', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Сколько раз пройти сценарий')
+        parser.add_argument('--output', default='benchmark_api.json',
+                            help='Файл для результатов в JSON')
+        parser.add_argument('--compare',
+                            help='JSON предыдущего запуска для сравнения')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        media_root = tempfile.mkdtemp()
+        try:
+            with override_settings(MEDIA_ROOT=media_root):
+                results = self.run_benchmark(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+        previous = {}
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                previous = json.load(file)
+        self.report(results, previous)
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты записаны в {options["output"]}'))
+
+    def run_benchmark(self, options):
+        self.stdout.write('Создание набора данных...')
+        dataset = create_dataset(users=options['users'],
+                                 recipes=options['recipes'],
+                                 ingredients=options['ingredients'],
+                                 follows=options['follows'],
+                                 favorites=options['favorites'],
+                                 carts=options['carts'])
+        client = APIClient()
+        context = get_context(dataset)
+        for endpoint in ENDPOINTS:
+            endpoint.request(client, context)
+        timings = {endpoint.name: [] for endpoint in ENDPOINTS}
+        queries = {}
+        for _ in range(options['repeat']):
+            for endpoint in ENDPOINTS:
+                _, count, elapsed = endpoint.request(client, context)
+                timings[endpoint.name].append(elapsed * 1000)
+                queries[endpoint.name] = count
+        results = {}
+        for endpoint in ENDPOINTS:
+            values = sorted(timings[endpoint.name])
+            results[endpoint.name] = {
+                'route': endpoint.route,
+                'queries': queries[endpoint.name],
+                'budget': endpoint.budget,
+                'p50_ms': round(statistics.median(values), 3),
+                'p95_ms': round(
+                    values[max(int(len(values) * 0.95) - 1, 0)], 3),
+            }
+        return results
+
+    def report(self, results, previous):
+        for name, result in results.items():
+            line = (f'{name}: запросов {result["queries"]}, '
+                    f'p50 {result["p50_ms"]} мс, p95 {result["p95_ms"]} мс')
+            old = previous.get(name)
+            if old:
+                change = ((result['p50_ms'] - old['p50_ms'])
+                          / old['p50_ms'] * 100 if old['p50_ms'] else 0)
+                line += (f' (было: запросов {old["queries"]}, '
+                         f'p50 {old["p50_ms"]} мс, {change:+.0f}%)')
+            style = (self.style.ERROR if result['queries'] > result['budget']
+                     else self.style.SUCCESS)
+            self.stdout.write(style(line))
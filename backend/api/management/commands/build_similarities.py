@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import RecipeSimilarity
+from recipes.similarity import CHUNK_SIZE, build_similarities
+
+
+class Command(BaseCommand):
+    help = ('Команда для пересчета похожих рецептов (top-K соседей '
+            'по ингредиентам) для всего каталога')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            help='Количество соседей рецепта, по умолчанию '
+                 'SIMILAR_RECIPES_TOP_K',
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help='Количество строк матрицы, перемножаемых за раз',
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = build_similarities(options['top_k'], options['chunk_size'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Похожие рецепты пересчитаны (модель '
+                f'{RecipeSimilarity.__name__}, строк: {count}, '
+                f'{time.perf_counter() - started:.1f} с)'
+            )
+        )
@@ -0,0 +1,52 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.transfer import FORMATS, RecordWriter, export_records, get_format
+
+
+class Command(BaseCommand):
+    help = 'Команда для выгрузки Рецептов в JSON Lines или csv'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл для записи или - для stdout')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Формат файла, по умолчанию по расширению',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество рецептов, читаемых из базы за раз',
+        )
+
+    def handle(self, *args, **options):
+        file_format = get_format(options['path'], options['format'])
+        if options['path'] == '-':
+            self.dump(sys.stdout, file_format, options['batch_size'])
+            return
+        try:
+            file = open(options['path'], 'w', encoding='utf-8', newline='')
+        except OSError as error:
+            raise CommandError(error)
+        with file:
+            count, elapsed = self.dump(file, file_format,
+                                       options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Выгружено рецептов: {count} '
+                f'({count / max(elapsed, 1e-9):.0f} строк/с)'
+            )
+        )
+
+    def dump(self, file, file_format, batch_size):
+        started = time.perf_counter()
+        writer = RecordWriter(file, file_format)
+        count = 0
+        for record in export_records(batch_size):
+            writer.write(record)
+            count += 1
+        return count, time.perf_counter() - started
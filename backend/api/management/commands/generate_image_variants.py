@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import generate_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Команда для создания уменьшенных копий картинок рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересоздать копии и для рецептов, у которых они уже есть',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        processed = failed = 0
+        for recipe_id, name in recipes.values_list('pk', 'image').iterator():
+            try:
+                generate_variants(recipe_id, name)
+            except OSError as error:
+                failed += 1
+                self.stderr.write(f'{name}: {error}')
+                continue
+            processed += 1
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Обработано картинок: {processed}, с ошибками: {failed}'
+            )
+        )
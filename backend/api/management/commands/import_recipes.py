@@ -0,0 +1,89 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.cache import recipe_ingredients_cache, recipe_response_cache
+from recipes.similarity import build_similarities, refresh_similarities
+from recipes.transfer import (FORMATS, RecipeImporter, get_format,
+                              read_records)
+
+
+class Command(BaseCommand):
+    help = ('Команда для загрузки Рецептов из JSON Lines или csv '
+            'с обновлением существующих по автору и названию')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл с рецептами или - для stdin')
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Формат файла, по умолчанию по расширению',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество рецептов в одной транзакции',
+        )
+        parser.add_argument(
+            '--rebuild-similarities',
+            action='store_true',
+            help='Пересчитать похожие рецепты для всего каталога, а не '
+                 'только для загруженных (быстрее для больших файлов)',
+        )
+
+    def handle(self, *args, **options):
+        file_format = get_format(options['path'], options['format'])
+        if options['path'] == '-':
+            self.load(sys.stdin, file_format, options)
+            return
+        try:
+            file = open(options['path'], encoding='utf-8', newline='')
+        except OSError as error:
+            raise CommandError(error)
+        with file:
+            self.load(file, file_format, options)
+
+    def load(self, file, file_format, options):
+        batch_size = options['batch_size']
+        importer = RecipeImporter(file_format)
+        started = time.perf_counter()
+        created = updated = skipped = 0
+        batch = []
+        for number, record in enumerate(read_records(file, file_format), 1):
+            try:
+                batch.append(importer.resolve(record))
+            except (KeyError, TypeError, ValueError) as error:
+                skipped += 1
+                self.stderr.write(f'Строка {number} пропущена: {error!r}')
+            if len(batch) >= batch_size:
+                batch_created, batch_updated = importer.import_batch(batch)
+                created += batch_created
+                updated += batch_updated
+                batch = []
+                self.report(created + updated, started)
+        if batch:
+            batch_created, batch_updated = importer.import_batch(batch)
+            created += batch_created
+            updated += batch_updated
+        if created or updated:
+            if options['rebuild_similarities']:
+                build_similarities()
+            else:
+                refresh_similarities(importer.changed_ids)
+            recipe_ingredients_cache.invalidate()
+            recipe_response_cache.invalidate()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Создано: {created}, обновлено: {updated}, '
+                f'пропущено: {skipped} '
+                f'({(created + updated) / max(elapsed, 1e-9):.0f} строк/с)'
+            )
+        )
+
+    def report(self, count, started):
+        elapsed = time.perf_counter() - started
+        self.stderr.write(f'{count} строк, '
+                          f'{count / max(elapsed, 1e-9):.0f} строк/с')
@@ -1,31 +1,75 @@
+import json
+import os
 from csv import DictReader
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 
+from api.cache import ingredient_cache
 from foodgram.settings import BASE_DIR
 from recipes.models import Ingredient
 
 path = str(BASE_DIR / 'static/data/')
 
 
+def read_ingredients(file, file_format):
+    """Отдает ингредиенты из csv или json по одному.
+
+    csv читается построчно, json - целиком через json.load: это один
+    массив, а запись в базу все равно идет пачками.
+    """
+    if file_format == 'json':
+        yield from json.load(file)
+    else:
+        yield from DictReader(file, fieldnames=['name', 'measurement_unit'])
+
+
 class Command(BaseCommand):
-    help = 'Команда для выгрузки Ингредиентов из csv в базу данных'
+    help = 'Команда для выгрузки Ингредиентов из csv или json в базу данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=path + '/ingredients.csv',
+            help='Файл с ингредиентами',
+        )
+        parser.add_argument(
+            '--format',
+            choices=('csv', 'json'),
+            help='Формат файла, по умолчанию по расширению',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки для bulk_create',
+        )
 
     def handle(self, *args, **options):
-        with open(path + '/ingredients.csv', 'r', encoding='utf-8') as file:
-            try:
-                reader = DictReader(file, fieldnames=['name',
-                                                      'measurement_unit'])
-                records = [Ingredient(**row) for row in reader]
-                Ingredient.objects.bulk_create(records)
-                self.stdout.write(
-                    self.style.SUCCESS(
-                        f'База заполнена (модель {Ingredient.__name__})'
-                    )
-                )
-            except Exception as error:
-                self.stdout.write(
-                    self.style.ERROR(
-                        f'Ошибка {error} при записи {Ingredient.__name__}'
-                    )
-                )
+        file_format = (options['format']
+                       or os.path.splitext(options['path'])[1].lstrip('.'))
+        before = Ingredient.objects.count()
+        try:
+            with open(options['path'], 'r', encoding='utf-8') as file:
+                records = (
+                    Ingredient(
+                        name=row['name'].strip(),
+                        measurement_unit=row['measurement_unit'].strip())
+                    for row in read_ingredients(file, file_format))
+                while True:
+                    batch = list(islice(records, options['batch_size']))
+                    if not batch:
+                        break
+                    Ingredient.objects.bulk_create(batch,
+                                                   ignore_conflicts=True)
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(
+                f'Ошибка {error!r} при записи {Ingredient.__name__}')
+        ingredient_cache.invalidate()
+        created = Ingredient.objects.count() - before
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'База заполнена (модель {Ingredient.__name__}, '
+                f'добавлено: {created})'
+            )
+        )
@@ -0,0 +1,66 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Команда для удаления картинок рецептов, на которые '
+            'не ссылается ни один рецепт')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60 * 60,
+            help='Не трогать файлы моложе стольких секунд',
+        )
+
+    def get_referenced(self):
+        referenced = set()
+        for image, variants in Recipe.objects.values_list(
+                'image', 'image_variants').iterator():
+            referenced.add(image)
+            for names in (variants or {}).values():
+                referenced.update(names.values())
+        return referenced
+
+    def get_unreferenced(self, storage, referenced, min_age):
+        upload_to = Recipe._meta.get_field('image').upload_to
+        root = storage.path(upload_to)
+        deadline = time.time() - min_age
+        for directory, _, files in os.walk(root):
+            for file_name in files:
+                path = os.path.join(directory, file_name)
+                name = os.path.relpath(path, storage.location).replace(
+                    os.sep, '/')
+                stat = os.stat(path)
+                if name not in referenced and stat.st_mtime < deadline:
+                    yield path, stat.st_size
+
+    def handle(self, *args, **options):
+        storage = Recipe._meta.get_field('image').storage
+        referenced = self.get_referenced()
+        removed = size = 0
+        for path, file_size in self.get_unreferenced(
+                storage, referenced, options['min_age']):
+            if options['dry_run']:
+                self.stdout.write(path)
+            else:
+                os.remove(path)
+            removed += 1
+            size += file_size
+        action = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{action} файлов: {removed} ({size} байт), '
+                f'используется: {len(referenced)}'
+            )
+        )
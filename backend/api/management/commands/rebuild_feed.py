@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from recipes.feed import rebuild_feed
+from recipes.models import FeedEntry
+
+
+class Command(BaseCommand):
+    help = ('Команда для пересборки лент подписок, например после '
+            'массовой загрузки рецептов')
+
+    def handle(self, *args, **options):
+        count = rebuild_feed()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Ленты пересобраны (модель {FeedEntry.__name__}, '
+                f'строк: {count})'
+            )
+        )
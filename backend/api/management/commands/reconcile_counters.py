@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.services import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = ('Команда для сверки счетчиков Избранного, подписчиков и '
+            'рецептов со связанными таблицами')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только найти расхождения, ничего не исправляя',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки для bulk_update',
+        )
+
+    def handle(self, *args, **options):
+        drift = reconcile_counters(options['batch_size'],
+                                   dry_run=options['check'])
+        report = ', '.join(f'{counter}: {count}'
+                           for counter, count in drift.items())
+        if options['check'] and any(drift.values()):
+            raise CommandError(
+                f'Расхождения счетчиков ({report}). '
+                f'Запустите команду без --check'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Исправлено строк: {report}'))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import RecipeScore
+from recipes.scores import refresh_recipe_scores
+
+
+class Command(BaseCommand):
+    help = ('Команда для пересчета оценок популярности рецептов. '
+            'Запускается периодически, например по cron')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки для bulk_create',
+        )
+
+    def handle(self, *args, **options):
+        count = refresh_recipe_scores(options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Оценки пересчитаны (модель {RecipeScore.__name__}, '
+                f'строк: {count})'
+            )
+        )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from api.cache import recipe_response_cache
+
+
+class Command(BaseCommand):
+    help = ('Доля попаданий в кэш ответов рецептов для анонимных '
+            'пользователей')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true',
+                            help='Обнулить счетчики после вывода')
+
+    def handle(self, *args, **options):
+        stats = recipe_response_cache.get_stats()
+        total = sum(stats.values())
+        ratio = (stats['hit'] + stats['stale']) / total if total else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Ответы рецептов: попаданий {stats["hit"]}, устаревших '
+            f'{stats["stale"]}, промахов {stats["miss"]}, '
+            f'доля попаданий {ratio:.1%}'))
+        if options['reset']:
+            recipe_response_cache.reset_stats()
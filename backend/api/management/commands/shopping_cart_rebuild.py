@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingCartIngredient
+from recipes.services import (get_shopping_cart_totals,
+                              rebuild_shopping_cart_ingredients)
+
+
+class Command(BaseCommand):
+    help = ('Команда для пересборки и проверки сумм ингредиентов '
+            'в Списках покупок')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только сравнить таблицу с суммами по рецептам',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки для bulk_create',
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            self.check_totals()
+            return
+        created = rebuild_shopping_cart_ingredients(options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Таблица пересобрана (модель '
+                f'{ShoppingCartIngredient.__name__}, строк: {created})'
+            )
+        )
+
+    def check_totals(self):
+        stored = {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount in
+            ShoppingCartIngredient.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount').iterator()
+        }
+        mismatches = 0
+        for user_id, ingredient_id, total_amount in (
+                get_shopping_cart_totals().iterator()):
+            if stored.pop((user_id, ingredient_id), None) != total_amount:
+                mismatches += 1
+        mismatches += len(stored)
+        if mismatches:
+            raise CommandError(
+                f'Расхождений в {ShoppingCartIngredient.__name__}: '
+                f'{mismatches}. Запустите команду без --check'
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Расхождений нет (модель {ShoppingCartIngredient.__name__})'
+            )
+        )
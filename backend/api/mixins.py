@@ -1,4 +1,13 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
 from rest_framework import mixins, viewsets
+from rest_framework.response import Response
 
 
 class CreateListRetrieveViewSet(mixins.CreateModelMixin,
@@ -6,3 +15,137 @@ class CreateListRetrieveViewSet(mixins.CreateModelMixin,
                                 mixins.RetrieveModelMixin,
                                 viewsets.GenericViewSet):
     pass
+
+
+def get_query_key(request, query_params=None):
+    """Путь и отсортированные параметры запроса"""
+    if query_params is None:
+        query_params = request.query_params.lists()
+    return '{}?{}'.format(request.path, urlencode(sorted(query_params),
+                                                  doseq=True))
+
+
+def get_versioned_response(request, data, name, version, key):
+    """Ответ с ETag и Last-Modified по версии данных или 304"""
+    etag = quote_etag(hashlib.md5(
+        f'{name}:{version}:{key}'.encode()).hexdigest())
+    last_modified = version // 10 ** 9
+    response = get_conditional_response(
+        request._request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = Response(data)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    return response
+
+
+class CachedCatalogMixin:
+    """Отдает list/retrieve справочника из CatalogCache с ETag.
+
+    Клиент с актуальной копией получает 304 без обращения к БД.
+    """
+    catalog_cache = None
+
+    def list(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, lambda: super(CachedCatalogMixin, self).list(
+                request, *args, **kwargs).data)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_cached_response(
+            request, lambda: super(CachedCatalogMixin, self).retrieve(
+                request, *args, **kwargs).data)
+
+    def get_cached_response(self, request, build):
+        key = get_query_key(request)
+        data, version = self.catalog_cache.get(key, build)
+        response = get_versioned_response(
+            request, data, self.catalog_cache.name, version, key)
+        patch_cache_control(response, no_cache=True)
+        return response
+
+
+class ConditionalRetrieveMixin:
+    """Отвечает на retrieve 304 до сериализации объекта.
+
+    ETag и Last-Modified считаются get_validators(instance) по полям
+    объекта и версиям связанных данных. Если у клиента актуальная копия,
+    связи retrieve_prefetch_related не загружаются и сериализатор
+    не запускается.
+    """
+    retrieve_prefetch_related = ()
+
+    def get_validators(self, instance):
+        """Возвращает (строка для ETag, Last-Modified в секундах или None)"""
+        raise NotImplementedError
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        source, last_modified = self.get_validators(instance)
+        etag = quote_etag(hashlib.md5(source.encode()).hexdigest())
+        response = get_conditional_response(
+            request._request, etag=etag, last_modified=last_modified)
+        if response is None:
+            prefetch_related_objects([instance],
+                                     *self.retrieve_prefetch_related)
+            response = Response(self.get_serializer(instance).data)
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class AnonymousResponseCacheMixin:
+    """Отдает list/retrieve анонимным пользователям из ResponseCache.
+
+    Ключ - хост, путь и нормализованные параметры из cached_query_params
+    (значения сортируются). Запросы с другими параметрами и ответы
+    с ошибкой не кэшируются.
+    """
+    response_cache = None
+    cached_query_params = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.get_anonymous_response(
+            request, lambda: super(AnonymousResponseCacheMixin, self).list(
+                request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_anonymous_response(
+            request, lambda: super(AnonymousResponseCacheMixin, self).retrieve(
+                request, *args, **kwargs))
+
+    def get_response_cache_key(self, request):
+        query_params = []
+        for name, values in request.query_params.lists():
+            if name not in self.cached_query_params:
+                return None
+            if name == 'page' and values == ['1']:
+                continue
+            query_params.append((name, sorted(values)))
+        return request.get_host() + get_query_key(request, query_params)
+
+    def get_anonymous_response(self, request, get_response):
+        key = self.get_response_cache_key(request)
+        if request.user.is_authenticated or key is None:
+            return get_response()
+        responses = []
+
+        def build():
+            responses.append(get_response())
+            if responses[0].status_code != 200:
+                return None
+            return responses[0].data
+
+        data, version = self.response_cache.get(key, build)
+        if data is None:
+            return responses[0]
+        response = get_versioned_response(
+            request, data, self.response_cache.name, version, key)
+        patch_cache_control(
+            response, public=True,
+            max_age=settings.RESPONSE_CACHE_MAX_AGE,
+            stale_while_revalidate=settings.RESPONSE_CACHE_STALE_TIMEOUT)
+        patch_vary_headers(response, ('Authorization',))
+        return response
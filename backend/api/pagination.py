@@ -1,5 +1,193 @@
-from rest_framework.pagination import PageNumberPagination
+import hashlib
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from django.db.models.constants import LOOKUP_SEP
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
-class CustomPagination(PageNumberPagination):
+from recipes.feed import get_feed, get_feed_page
+
+
+class KeysetPagination(BasePagination):
+    """Курсорная пагинация по полям сортировки выборки.
+
+    Следующая страница выбирается условием "после последней записи"
+    по (pub_date, id) и т.п., без OFFSET и COUNT(*). Общее количество
+    отдается только по запросу (?count=1) и берется из кэша.
+    """
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return page_size if page_size > 0 else self.page_size
+
+    def get_ordering(self, queryset):
+        ordering = list(queryset.query.order_by
+                        or queryset.model._meta.ordering)
+        if not all(isinstance(field, str) for field in ordering):
+            raise ValidationError(
+                'Курсорная пагинация недоступна для этой сортировки')
+        pk_name = queryset.model._meta.pk.name
+        if not ordering or ordering[-1].lstrip('-') not in ('pk', pk_name):
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append(f'-{pk_name}' if descending else pk_name)
+        return ordering
+
+    def get_field(self, queryset, name):
+        """Поле модели или аннотации, по которому идет сортировка"""
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        model = queryset.model
+        *path, name = name.split(LOOKUP_SEP)
+        for part in path:
+            model = model._meta.get_field(part).related_model
+        if name == 'pk':
+            return model._meta.pk
+        return model._meta.get_field(name)
+
+    def decode_cursor(self, request, queryset, fields):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor is None:
+            return None
+        try:
+            values = json.loads(urlsafe_b64decode(cursor.encode()))
+        except ValueError:
+            raise ValidationError('Неверный курсор')
+        if not isinstance(values, list) or len(values) != len(fields):
+            raise ValidationError('Неверный курсор')
+        try:
+            values = [
+                self.get_field(queryset, field.lstrip('-')).to_python(value)
+                for field, value in zip(fields, values)]
+        except (ValueError, TypeError, DjangoValidationError):
+            raise ValidationError('Неверный курсор')
+        if None in values:
+            raise ValidationError('Неверный курсор')
+        return values
+
+    def encode_cursor(self, obj, fields):
+        if isinstance(obj, dict):
+            values = [str(obj[field.lstrip('-')]) for field in fields]
+        else:
+            values = [str(getattr(obj, field.lstrip('-')))
+                      for field in fields]
+        return urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def get_keyset_filter(self, fields, values):
+        """Условие "строго после" записи с values в порядке fields"""
+        condition = Q()
+        for position, field in enumerate(fields):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            step = Q(**{f'{name}__{lookup}': values[position]})
+            for previous, value in zip(fields[:position], values):
+                step &= Q(**{previous.lstrip('-'): value})
+            condition |= step
+        return condition
+
+    def get_count(self, queryset):
+        key = 'pagination:count:{}'.format(
+            hashlib.md5(str(queryset.query).encode()).hexdigest())
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        fields = self.get_ordering(queryset)
+        queryset = queryset.order_by(*fields)
+        self.count = None
+        if request.query_params.get(self.count_query_param):
+            self.count = self.get_count(queryset)
+        values = self.decode_cursor(request, queryset, fields)
+        if values is not None:
+            queryset = queryset.filter(
+                self.get_keyset_filter(fields, values))
+        page_size = self.get_page_size(request)
+        page = list(queryset[:page_size + 1])
+        self.next_cursor = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_cursor = self.encode_cursor(page[-1], fields)
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.next_cursor)
+
+    def get_paginated_response(self, data):
+        response_data = {'next': self.get_next_link(), 'results': data}
+        if self.count is not None:
+            response_data = {'count': self.count, **response_data}
+        return Response(response_data)
+
+
+class FeedPagination(KeysetPagination):
+    """Курсорная пагинация ленты подписок текущего пользователя.
+
+    Страница - ключи (pub_date, id) из get_feed_page(), по которым
+    из queryset (рецепты или их values()) выбираются сами рецепты.
+    """
+    ordering = ('-pub_date', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        user = request.user
+        self.count = None
+        if request.query_params.get(self.count_query_param):
+            self.count = self.get_count(get_feed(queryset, user))
+        after = self.decode_cursor(request, queryset, self.ordering)
+        page_size = self.get_page_size(request)
+        keys = get_feed_page(user, page_size + 1, after)
+        self.next_cursor = None
+        if len(keys) > page_size:
+            keys = keys[:page_size]
+            pub_date, pk = keys[-1]
+            self.next_cursor = self.encode_cursor(
+                {'pub_date': pub_date, 'id': pk}, self.ordering)
+        pk_name = queryset.model._meta.pk.name
+        recipes = {}
+        for recipe in queryset.filter(pk__in=[pk for _, pk in keys]):
+            recipes[recipe[pk_name] if isinstance(recipe, dict)
+                    else recipe.pk] = recipe
+        return [recipes[pk] for _, pk in keys if pk in recipes]
+
+
+class PageLimitPagination(PageNumberPagination):
+    """Постраничная пагинация с размером страницы в параметре limit"""
     page_size_query_param = 'limit'
+
+
+class CustomPagination(PageLimitPagination):
+    """Постраничная пагинация с курсорным режимом (?pagination=cursor)"""
+    mode_query_param = 'pagination'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if request.query_params.get(self.mode_query_param) == 'cursor':
+            self.keyset = KeysetPagination()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,95 @@
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from recipes.models import Recipe, RecipeIngredient
+from recipes.similarity import load_pairs
+from .cache import recipe_ingredients_cache
+
+PantryState = namedtuple('PantryState',
+                         ('recipe_ids', 'sizes', 'rows', 'bitsets'))
+
+
+class PantryIndex:
+    """Обратный индекс ингредиент -> множество рецептов для "что приготовить".
+
+    Для каждого ингредиента хранится битовое множество рецептов
+    (np.packbits, бит на рецепт), рецепты упорядочены по дате публикации.
+    Число совпавших ингредиентов считается сложением битовых строк
+    ингредиентов из запроса. Индекс строится при первом поиске и
+    перестраивается, когда меняется версия в recipe_ingredients_cache;
+    пока идет перестройка, запросы обслуживает прежняя версия.
+    """
+
+    def __init__(self):
+        self.version = None
+        self.state = None
+        self.lock = threading.Lock()
+
+    def ensure_built(self):
+        version = recipe_ingredients_cache.get_version()
+        if version == self.version:
+            return self.state
+        if not self.lock.acquire(blocking=self.state is None):
+            return self.state
+        try:
+            if version != self.version:
+                self.state = self.build()
+                self.version = version
+        finally:
+            self.lock.release()
+        return self.state
+
+    def build(self):
+        recipe_ids = np.fromiter(
+            Recipe.objects.order_by('-pub_date', '-id').values_list(
+                'pk', flat=True).iterator(), dtype=np.int64)
+        pairs = load_pairs(RecipeIngredient.objects.all())
+        # Рецепты, созданные между двумя запросами, попадут в следующую
+        # версию индекса.
+        pairs = pairs[np.isin(pairs[:, 0], recipe_ids)]
+        order = np.argsort(recipe_ids)
+        positions = order[np.searchsorted(recipe_ids, pairs[:, 0],
+                                          sorter=order)]
+        sizes = np.bincount(positions, minlength=len(recipe_ids))
+        ingredients, columns = np.unique(pairs[:, 1], return_inverse=True)
+        bitsets = np.zeros((len(ingredients), (len(recipe_ids) + 7) // 8),
+                           dtype=np.uint8)
+        np.bitwise_or.at(bitsets, (columns.ravel(), positions // 8),
+                         (128 >> (positions % 8)).astype(np.uint8))
+        return PantryState(
+            recipe_ids=recipe_ids,
+            sizes=sizes,
+            rows={int(pk): row for row, pk in enumerate(ingredients)},
+            bitsets=bitsets)
+
+    def search(self, ingredient_ids, max_missing=None):
+        """Рецепты по убыванию доли имеющихся ингредиентов.
+
+        Возвращает массивы (id рецептов, совпало ингредиентов, всего
+        ингредиентов). При равной доле выше рецепты с меньшим числом
+        недостающих, затем более новые.
+        """
+        state = self.ensure_built()
+        rows = sorted({state.rows[pk] for pk in ingredient_ids
+                       if pk in state.rows})
+        if not rows:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, empty
+        matched = np.unpackbits(state.bitsets[rows], axis=1,
+                                count=len(state.recipe_ids)).sum(
+                                    axis=0, dtype=np.int64)
+        missing = state.sizes - matched
+        selected = matched > 0
+        if max_missing is not None:
+            selected &= missing <= max_missing
+        positions = np.flatnonzero(selected)
+        order = np.lexsort((positions, missing[positions],
+                            -matched[positions] / state.sizes[positions]))
+        positions = positions[order]
+        return (state.recipe_ids[positions], matched[positions],
+                state.sizes[positions])
+
+
+pantry_index = PantryIndex()
@@ -0,0 +1,161 @@
+import csv
+import logging
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import mm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
+from reportlab.pdfgen import canvas
+from rest_framework import renderers
+
+TITLE = 'Список покупок'
+EMPTY_MESSAGE = 'Список покупок ПУСТ'
+
+logger = logging.getLogger(__name__)
+
+
+class ShoppingCartRenderer(renderers.BaseRenderer):
+    """Базовый рендерер списка покупок.
+
+    Документ отдается частями через stream(); txt и csv пишутся
+    построчно и не собираются в памяти целиком. render() нужен только
+    для ответов с ошибками, которые DRF рендерит выбранным рендерером.
+    """
+    charset = 'utf-8'
+
+    @property
+    def content_type(self):
+        if self.charset:
+            return f'{self.media_type}; charset={self.charset}'
+        return self.media_type
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict) and 'detail' in data:
+            data = data['detail']
+        return b''.join(self.stream_message(str(data)))
+
+    def stream(self, rows):
+        """Отдает документ частями по строкам (name, unit, amount)."""
+        raise NotImplementedError(
+            'Рендерер списка покупок должен реализовать stream()')
+
+    def stream_message(self, message):
+        yield message.encode(self.charset)
+
+
+class ShoppingCartTxtRenderer(ShoppingCartRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        empty = True
+        for name, measurement_unit, amount in rows:
+            if empty:
+                yield f'{TITLE}\n'.encode(self.charset)
+                empty = False
+            yield (f'   - {name} ({measurement_unit}) - {amount}\n'.
+                   encode(self.charset))
+        if empty:
+            yield from self.stream_message(EMPTY_MESSAGE)
+
+
+class Echo:
+    """Псевдо-файл для csv.writer: возвращает записанную строку"""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingCartCSVRenderer(ShoppingCartRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(
+            ('name', 'measurement_unit', 'amount')).encode(self.charset)
+        for row in rows:
+            yield writer.writerow(row).encode(self.charset)
+
+
+class ShoppingCartPDFRenderer(ShoppingCartRenderer):
+    """Рендерер списка покупок в PDF.
+
+    Это не потоковая генерация: reportlab собирает документ целиком
+    до save(). Страницы пишутся во временный файл, который остается
+    в памяти только пока он небольшой, и уже готовый файл отдается
+    клиенту частями.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_name = 'ShoppingCartFont'
+    font_size = 12
+    line_height = 7 * mm
+    margin = 20 * mm
+    chunk_size = 64 * 1024
+
+    def get_font_name(self):
+        """Шрифт с кириллицей из SHOPPING_CART_PDF_FONT.
+
+        Встроенные шрифты PDF кириллицы не содержат, поэтому без него
+        документ не строится: ошибка пишется в лог и поднимается.
+        """
+        if self.font_name in pdfmetrics.getRegisteredFontNames():
+            return self.font_name
+        path = settings.SHOPPING_CART_PDF_FONT
+        try:
+            pdfmetrics.registerFont(TTFont(self.font_name, path))
+        except (OSError, TTFError) as error:
+            logger.error('Не удалось загрузить шрифт для PDF %s: %s',
+                         path, error)
+            raise ImproperlyConfigured(
+                f'Шрифт для PDF не загружается: {path}') from error
+        return self.font_name
+
+    def stream(self, rows):
+        # Шрифт проверяется до начала ответа, а не внутри генератора.
+        font_name = self.get_font_name()
+        lines = (f'{name} ({measurement_unit}) - {amount}'
+                 for name, measurement_unit, amount in rows)
+        return self.stream_lines(lines, font_name)
+
+    def stream_message(self, message):
+        return self.stream_lines(iter(()), self.get_font_name(),
+                                 title=message)
+
+    def stream_lines(self, lines, font_name, title=TITLE):
+        width, height = A4
+        with SpooledTemporaryFile(max_size=1024 * 1024) as file:
+            pdf = canvas.Canvas(file, pagesize=A4)
+            pdf.setTitle(TITLE)
+            pdf.setFont(font_name, self.font_size + 4)
+            pdf.drawString(self.margin, height - self.margin, title)
+            pdf.setFont(font_name, self.font_size)
+            y = height - self.margin - 2 * self.line_height
+            empty = True
+            for line in lines:
+                empty = False
+                if y < self.margin:
+                    pdf.showPage()
+                    pdf.setFont(font_name, self.font_size)
+                    y = height - self.margin
+                pdf.drawString(self.margin, y, f'• {line}')
+                y -= self.line_height
+            if empty and title == TITLE:
+                pdf.drawString(self.margin, y, EMPTY_MESSAGE)
+            pdf.save()
+            file.seek(0)
+            while True:
+                chunk = file.read(self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+
+SHOPPING_CART_RENDERERS = (ShoppingCartTxtRenderer,
+                           ShoppingCartCSVRenderer,
+                           ShoppingCartPDFRenderer)
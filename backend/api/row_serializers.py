@@ -0,0 +1,104 @@
+from operator import itemgetter
+
+from django.contrib.auth import get_user_model
+
+from recipes.models import Recipe, RecipeIngredient
+from .viewer import get_viewer_state
+
+User = get_user_model()
+
+RECIPE_FIELDS = ('id', 'name', 'image', 'image_variants', 'text',
+                 'cooking_time', 'author_id', 'pub_date')
+TAG_FIELDS = ('id', 'name', 'color', 'slug')
+AUTHOR_FIELDS = ('email', 'id', 'username', 'first_name', 'last_name')
+INGREDIENT_FIELDS = ('id', 'name', 'measurement_unit', 'amount')
+
+get_recipe_values = itemgetter('id', 'name', 'image', 'image_variants',
+                               'text', 'cooking_time', 'author_id')
+
+
+class RecipeRowSerializer:
+    """Вывод RecipeSerializer только для чтения, собранный из values().
+
+    Принимает строки Recipe.objects.values(*RECIPE_FIELDS) или один
+    рецепт с загруженным автором. Тэги, ингредиенты и авторы страницы
+    читаются values_list по запросу на связь, флаги пользователя берутся
+    из ViewerState. Ключи и типы значений совпадают с RecipeSerializer,
+    поэтому JSON получается тем же байт в байт.
+    """
+
+    def __init__(self, instance, many=False, context=None):
+        self.instance = instance
+        self.many = many
+        self.request = (context or {}).get('request')
+        self.storage = Recipe._meta.get_field('image').storage
+
+    @property
+    def data(self):
+        if self.many:
+            return self.serialize(list(self.instance))
+        recipe = self.instance
+        row = {field: getattr(recipe, field) for field in RECIPE_FIELDS}
+        row['image'] = recipe.image.name
+        author = recipe.author
+        authors = {author.pk: tuple(getattr(author, field)
+                                    for field in AUTHOR_FIELDS)}
+        return self.serialize([row], authors)[0]
+
+    def get_url(self, name):
+        url = self.storage.url(name)
+        if self.request is not None:
+            url = self.request.build_absolute_uri(url)
+        return url
+
+    def get_image_variants(self, variants):
+        return {variant: {extension: self.get_url(name)
+                          for extension, name in names.items()}
+                for variant, names in (variants or {}).items()}
+
+    def serialize(self, rows, authors=None):
+        recipe_ids = [row['id'] for row in rows]
+        tags = {recipe_id: [] for recipe_id in recipe_ids}
+        for recipe_id, *values in (
+                Recipe.tags.through.objects.
+                filter(recipe_id__in=recipe_ids).
+                order_by('tag_id').
+                values_list('recipe_id', *(f'tag__{field}'
+                                           for field in TAG_FIELDS))):
+            tags[recipe_id].append(dict(zip(TAG_FIELDS, values)))
+        ingredients = {recipe_id: [] for recipe_id in recipe_ids}
+        for recipe_id, *values in (
+                RecipeIngredient.objects.
+                filter(recipe_id__in=recipe_ids).
+                order_by('id').
+                values_list('recipe_id', 'ingredient_id', 'ingredient__name',
+                            'ingredient__measurement_unit', 'amount')):
+            ingredients[recipe_id].append(dict(zip(INGREDIENT_FIELDS,
+                                                   values)))
+        if authors is None:
+            authors = {
+                author[1]: author
+                for author in User.objects.filter(
+                    pk__in={row['author_id'] for row in rows}).values_list(
+                        *AUTHOR_FIELDS)}
+        viewer = get_viewer_state(self.request)
+        data = []
+        for row in rows:
+            (recipe_id, name, image, image_variants, text, cooking_time,
+             author_id) = get_recipe_values(row)
+            author = dict(zip(AUTHOR_FIELDS, authors[author_id]))
+            author['is_subscribed'] = viewer.is_following(author_id)
+            data.append({
+                'id': recipe_id,
+                'tags': tags[recipe_id],
+                'author': author,
+                'ingredients': ingredients[recipe_id],
+                'is_favorited': viewer.is_favorited(recipe_id),
+                'is_in_shopping_cart': viewer.is_in_shopping_cart(recipe_id),
+                'name': name,
+                'image': self.get_url(image) if image else None,
+                'image_variants': self.get_image_variants(image_variants),
+                'text': text,
+                'cooking_time': cooking_time,
+            })
+        return data
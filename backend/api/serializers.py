@@ -1,13 +1,20 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.validators import UniqueValidator
 
 from foodgram.settings import RECIPES_LIMIT
-from recipes.models import (Favorite, Follow, Ingredient, Recipe,
-                            RecipeIngredient, ShoppingCart, Tag)
+from recipes.images import schedule_variants
+from recipes.models import Follow, Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.search import refresh_search_documents
+from recipes.similarity import schedule_similarity_refresh
+from recipes.services import (set_recipe_ingredients, set_recipe_tags,
+                              update_recipe_in_shopping_carts)
 from users.validators import validate_username_not_me
-from .fields import Base64ImageField
+from .fields import (Base64ImageField, BulkListSerializer,
+                     BulkPrimaryKeyRelatedField, ImageVariantsField)
+from .viewer import get_viewer_state
 
 User = get_user_model()
 
@@ -46,10 +53,7 @@ class UserSerializer(serializers.ModelSerializer):
                   'is_subscribed')
 
     def get_is_subscribed(self, obj):
-        current_user = self.context['request'].user
-        if current_user.is_anonymous:
-            return False
-        return Follow.objects.filter(user=current_user, following=obj).exists()
+        return get_viewer_state(self.context['request']).is_following(obj.pk)
 
     def create(self, validated_data):
         user = User.objects.create(**validated_data)
@@ -77,6 +81,13 @@ class SetPasswordSerializer(serializers.Serializer):
         return data
 
 
+class RecipesLimitSerializer(serializers.Serializer):
+    """Параметр recipes_limit для Подписок"""
+
+    recipes_limit = serializers.IntegerField(min_value=0,
+                                             default=RECIPES_LIMIT)
+
+
 class FollowSerializer(serializers.ModelSerializer):
     """Сериализатор отображения Подписок"""
     email = serializers.ReadOnlyField(source='following.email')
@@ -86,31 +97,35 @@ class FollowSerializer(serializers.ModelSerializer):
     last_name = serializers.ReadOnlyField(source='following.last_name')
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField(
+        source='following.recipes_count')
 
     class Meta:
         model = Follow
         fields = ('email', 'id', 'username', 'first_name', 'last_name',
                   'is_subscribed', 'recipes', 'recipes_count')
 
+    @staticmethod
+    def get_recipes_limit(request):
+        """Проверенный recipes_limit, иначе ValidationError (400)"""
+        query = RecipesLimitSerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return query.validated_data['recipes_limit']
+
     def get_is_subscribed(self, obj):
-        current_user = self.context['request'].user
-        if current_user.is_anonymous:
-            return False
-        return Follow.objects.filter(user=current_user,
-                                     following=obj.following).exists()
+        viewer = get_viewer_state(self.context['request'])
+        if obj.user_id == viewer.user.pk:
+            return True
+        return viewer.is_following(obj.following_id)
 
     def get_recipes(self, obj):
-        recipes_limit = (self.context.get('request').query_params.
-                         get('recipes_limit'))
-        if recipes_limit is None:
-            recipes_limit = RECIPES_LIMIT
-        recipes = obj.following.recipes.all()[:int(recipes_limit)]
+        if hasattr(obj.following, 'latest_recipes'):
+            recipes = obj.following.latest_recipes
+        else:
+            recipes_limit = self.get_recipes_limit(self.context['request'])
+            recipes = obj.following.recipes.all()[:recipes_limit]
         return RecipeLightSerializer(recipes, many=True).data
 
-    def get_recipes_count(self, obj):
-        return obj.following.recipes.count()
-
 
 class IngredientSerializer(serializers.ModelSerializer):
     """Сериализатор отображения ингредиентов"""
@@ -131,7 +146,8 @@ class TagSerializer(serializers.ModelSerializer):
 class RecipeIngredientSerializer(serializers.ModelSerializer):
     """Сериализатор для работы с Игредиентами в Рецепте"""
 
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = BulkPrimaryKeyRelatedField(queryset=Ingredient.objects.all(),
+                                    source='ingredient')
     name = serializers.ReadOnlyField(source='ingredient.name')
     measurement_unit = serializers.ReadOnlyField(
         source='ingredient.measurement_unit')
@@ -140,12 +156,7 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
     class Meta:
         model = RecipeIngredient
         fields = ('id', 'name', 'measurement_unit', 'amount')
-
-    def to_representation(self, instance):
-        data = (super(RecipeIngredientSerializer, self).
-                to_representation(instance))
-        data['id'] = instance.ingredient.id
-        return data
+        list_serializer_class = BulkListSerializer
 
 
 class RecipeSerializer(serializers.ModelSerializer):
@@ -157,6 +168,7 @@ class RecipeSerializer(serializers.ModelSerializer):
                                              many=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
@@ -168,28 +180,41 @@ class RecipeSerializer(serializers.ModelSerializer):
                   'is_in_shopping_cart',
                   'name',
                   'image',
+                  'image_variants',
                   'text',
                   'cooking_time')
 
     def get_is_favorited(self, obj):
-        current_user = self.context['request'].user
-        if current_user.is_anonymous:
-            return False
-        return Favorite.objects.filter(user=current_user, recipe=obj).exists()
+        return get_viewer_state(self.context['request']).is_favorited(obj.pk)
 
     def get_is_in_shopping_cart(self, obj):
-        current_user = self.context['request'].user
-        if current_user.is_anonymous:
-            return False
-        return (ShoppingCart.objects.filter(user=current_user, recipe=obj).
-                exists())
+        return get_viewer_state(
+            self.context['request']).is_in_shopping_cart(obj.pk)
+
+
+class PantryRecipeSerializer(RecipeSerializer):
+    """Рецепт с долей ингредиентов, которые есть у пользователя"""
+
+    coverage = serializers.FloatField(read_only=True)
+    missing = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ('coverage', 'missing')
+
+
+class PantryQuerySerializer(serializers.Serializer):
+    """Параметры поиска рецептов по имеющимся ингредиентам"""
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False)
+    max_missing = serializers.IntegerField(min_value=0, required=False)
 
 
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     """Сериализатор для создания / редактирования Рецепта"""
 
-    tags = serializers.PrimaryKeyRelatedField(queryset=Tag.objects.all(),
-                                              many=True)
+    tags = BulkPrimaryKeyRelatedField(queryset=Tag.objects.all(),
+                                      many=True)
     image = Base64ImageField()
     ingredients = RecipeIngredientSerializer(many=True)
 
@@ -208,7 +233,8 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         if not value:
             raise serializers.ValidationError(
                 'Нужно выбрать хотя бы один ингредиент!')
-        ingredients_list = [ingredient.get('id') for ingredient in value]
+        ingredients_list = [ingredient['ingredient'].pk
+                            for ingredient in value]
         if len(set(ingredients_list)) < len(ingredients_list):
             raise serializers.ValidationError(
                 f'Выбранные ингредиенты повторяются! {ingredients_list}')
@@ -218,7 +244,7 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         ingredients_data = []
         for ingredient_orderdict in ingredients:
             recipe_ingredient = RecipeIngredient(
-                ingredient=ingredient_orderdict.get('id'),
+                ingredient=ingredient_orderdict['ingredient'],
                 recipe=recipe,
                 amount=ingredient_orderdict.get('amount')
             )
@@ -231,33 +257,54 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             context={'request': self.context.get('request')}
         ).data
 
+    @transaction.atomic
     def create(self, validated_data):
         current_user = self.context.get('request').user
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data, author=current_user)
-        recipe.tags.set(tags)
+        recipe.tags.add(*tags)
         ingredients_data = self.get_ingredients_data(ingredients, recipe)
         RecipeIngredient.objects.bulk_create(ingredients_data)
+        refresh_search_documents([recipe.pk])
+        schedule_similarity_refresh([recipe.pk])
+        schedule_variants(recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
+        if 'image' in validated_data:
+            validated_data['image_variants'] = {}
+        search_changed = any(
+            field in validated_data
+            and validated_data[field] != getattr(instance, field)
+            for field in ('name', 'text'))
         if 'ingredients' in validated_data:
-            ingredients = validated_data.pop('ingredients')
-            ingredients_data = self.get_ingredients_data(ingredients, instance)
-            instance.ingredients.clear()
-            RecipeIngredient.objects.bulk_create(ingredients_data)
+            amounts = {
+                ingredient['ingredient'].pk: ingredient.get('amount')
+                for ingredient in validated_data.pop('ingredients')}
+            old_amounts = set_recipe_ingredients(instance, amounts)
+            update_recipe_in_shopping_carts(instance, old_amounts, amounts)
+            if amounts.keys() != old_amounts.keys():
+                search_changed = True
+                schedule_similarity_refresh([instance.pk])
         if 'tags' in validated_data:
-            tags = validated_data.pop('tags')
-            instance.tags.set(tags)
-            super().update(instance, validated_data)
+            set_recipe_tags(instance,
+                            [tag.pk for tag in validated_data.pop('tags')])
+        super().update(instance, validated_data)
+        if search_changed:
+            refresh_search_documents([instance.pk])
+        if 'image' in validated_data:
+            schedule_variants(instance)
         return instance
 
 
 class RecipeLightSerializer(serializers.ModelSerializer):
     """Сериализатор для отображения Рецептов в простом формате"""
 
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time',)
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time',)
         read_only_fields = ('id', 'name', 'image', 'cooking_time',)
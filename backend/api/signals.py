@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.images import variants_generated
+from recipes.models import (Favorite, Follow, Ingredient, Recipe,
+                            ShoppingCart, Tag)
+from .cache import (ingredient_cache, recipe_ingredients_cache,
+                    recipe_response_cache, tag_cache)
+from .viewer import invalidate_viewer_state
+
+User = get_user_model()
+# Поля автора, которые попадают в ответы с рецептами.
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+def invalidate_catalog(catalog_cache):
+    """Сбрасывает кэш сразу и еще раз после коммита транзакции.
+
+    Второй сброс убирает данные, закэшированные параллельным запросом
+    до того, как изменения стали видны.
+    """
+    catalog_cache.invalidate()
+    transaction.on_commit(catalog_cache.invalidate)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_cache(sender, **kwargs):
+    invalidate_catalog(ingredient_cache)
+    invalidate_catalog(recipe_response_cache)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tag_cache(sender, **kwargs):
+    invalidate_catalog(tag_cache)
+    invalidate_catalog(recipe_response_cache)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_recipe_caches(sender, **kwargs):
+    """Ингредиенты и тэги рецепта пишутся вместе с ним, в той же
+    транзакции, поэтому их покрывает сброс после коммита"""
+    invalidate_catalog(recipe_ingredients_cache)
+    invalidate_catalog(recipe_response_cache)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_responses(sender, instance, created, update_fields,
+                                **kwargs):
+    """Ответы с рецептами содержат профиль автора"""
+    if created or not instance.recipes_count:
+        return
+    if update_fields is not None and not AUTHOR_FIELDS & set(update_fields):
+        return
+    invalidate_catalog(recipe_response_cache)
+
+
+@receiver(variants_generated, sender=Recipe)
+def invalidate_recipe_responses(sender, **kwargs):
+    recipe_response_cache.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Follow)
+@receiver((post_save, post_delete), sender=Favorite)
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def invalidate_viewer(sender, instance, **kwargs):
+    invalidate_viewer_state(instance.user_id)
@@ -0,0 +1,133 @@
+import base64
+import os
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from recipes.images import generate_variants
+from recipes.models import Recipe
+from ..benchmarks.factories import create_users
+from ..fields import Base64ImageField
+from ..serializers import RecipeLightSerializer
+
+
+def get_image(width, height, image_format='PNG'):
+    file = BytesIO()
+    Image.new('RGB', (width, height), 'red').save(file, image_format)
+    return file.getvalue()
+
+
+class ImagePipelineTestCase(TestCase):
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.addCleanup(shutil.rmtree, self.media_root, True)
+
+    def test_base64_field_decodes_to_file(self):
+        content = get_image(40, 30)
+        data = 'data:image/png;base64,' + base64.b64encode(content).decode()
+        with override_settings(IMAGE_UPLOAD_SPOOL_SIZE=16):
+            file = Base64ImageField().to_internal_value(data)
+        self.assertEqual(file.size, len(content))
+        self.assertEqual(file.read(), content)
+
+    def test_base64_field_rejects_large_and_broken_images(self):
+        data = 'data:image/png;base64,' + base64.b64encode(
+            get_image(300, 20)).decode()
+        with override_settings(IMAGE_UPLOAD_MAX_SIDE=200):
+            with self.assertRaises(ValidationError):
+                Base64ImageField().to_internal_value(data)
+        with override_settings(IMAGE_UPLOAD_MAX_PIXELS=5000):
+            with self.assertRaises(ValidationError):
+                Base64ImageField().to_internal_value(data)
+        for broken in ('data:image/png;base64,#$%', 'data:image/png;base64,'
+                       + base64.b64encode(b'not an image').decode()):
+            with self.assertRaises(ValidationError):
+                Base64ImageField().to_internal_value(broken)
+
+    def create_recipe(self, content, name='photo.jpg'):
+        author = create_users(1)[0]
+        recipe = Recipe(author_id=author, name='Рецепт', text='Описание',
+                        cooking_time=1)
+        recipe.image.save(name, BytesIO(content))
+        return recipe
+
+    def test_storage_deduplicates_by_content(self):
+        content = get_image(20, 20, 'JPEG')
+        first = self.create_recipe(content)
+        second = self.create_recipe(content, 'other.JPG')
+        other = self.create_recipe(get_image(21, 20, 'JPEG'))
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertNotEqual(first.image.name, other.image.name)
+        self.assertTrue(first.image.name.startswith('recipes/images/'))
+        self.assertTrue(first.image.name.endswith('.jpg'))
+
+    def test_unreferenced_image_left_to_media_gc(self):
+        content = get_image(20, 20, 'JPEG')
+        first = self.create_recipe(content)
+        second = self.create_recipe(content)
+        storage = first.image.storage
+        name = first.image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+            second.image.save('new.png', BytesIO(get_image(5, 5)))
+        self.assertTrue(storage.exists(name))
+        call_command('media_gc', '--min-age=0', stdout=StringIO())
+        self.assertFalse(storage.exists(name))
+        self.assertTrue(storage.exists(second.image.name))
+
+    def test_storage_refreshes_mtime_of_existing_file(self):
+        content = get_image(20, 20, 'JPEG')
+        recipe = self.create_recipe(content)
+        path = recipe.image.path
+        os.utime(path, (0, 0))
+        self.create_recipe(content)
+        self.assertGreater(os.stat(path).st_mtime, 0)
+
+    def test_media_gc(self):
+        recipe = self.create_recipe(get_image(20, 20, 'JPEG'))
+        storage = recipe.image.storage
+        orphan = storage.save('recipes/images/orphan.png',
+                              BytesIO(get_image(3, 3)))
+        out = StringIO()
+        call_command('media_gc', '--dry-run', '--min-age=0', stdout=out)
+        self.assertIn(os.path.basename(orphan), out.getvalue())
+        self.assertTrue(storage.exists(orphan))
+        call_command('media_gc', '--min-age=0', stdout=StringIO())
+        self.assertFalse(storage.exists(orphan))
+        self.assertTrue(storage.exists(recipe.image.name))
+
+    @override_settings(IMAGE_VARIANTS={'thumbnail': (16, 16),
+                                       'card': (64, 64)})
+    def test_generate_variants(self):
+        recipe = self.create_recipe(get_image(200, 100, 'JPEG'))
+        self.assertEqual(
+            RecipeLightSerializer(recipe).data['image_variants'], {})
+        variants = generate_variants(recipe.pk, recipe.image.name)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants, variants)
+        image_dir = os.path.dirname(recipe.image.name)
+        for names in variants.values():
+            for name in names.values():
+                self.assertEqual(os.path.dirname(os.path.dirname(name)),
+                                 os.path.dirname(image_dir))
+        storage = recipe.image.storage
+        for variant, size in (('thumbnail', (16, 8)), ('card', (64, 32))):
+            for extension, image_format in (('webp', 'WEBP'),
+                                            ('jpeg', 'JPEG')):
+                with storage.open(variants[variant][extension]) as file, \
+                        Image.open(file) as image:
+                    self.assertEqual(image.format, image_format)
+                    self.assertEqual(image.size, size)
+        self.assertEqual(
+            RecipeLightSerializer(recipe).data['image_variants']['card'],
+            {extension: storage.url(name) for extension, name
+             in variants['card'].items()})
@@ -0,0 +1,71 @@
+import shutil
+import tempfile
+from http import HTTPStatus
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import URLResolver
+from rest_framework.test import APIClient
+
+from api import urls
+from ..benchmarks.endpoints import ENDPOINTS, get_context
+from ..benchmarks.factories import create_dataset
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def get_route_names(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from get_route_names(pattern.url_patterns)
+        elif pattern.name:
+            yield pattern.name
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class QueryBudgetTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.dataset = create_dataset(users=30, recipes=60, ingredients=50,
+                                     follows=5, favorites=5, carts=3)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.context = get_context(self.dataset)
+
+    def test_every_route_has_budget(self):
+        """Для каждого маршрута api/urls.py есть запрос в сценарии."""
+        self.assertEqual(
+            set(get_route_names(urls.urlpatterns)) - {'api-root-format'},
+            {endpoint.route for endpoint in ENDPOINTS})
+
+    def test_endpoints_fit_query_budget(self):
+        for endpoint in ENDPOINTS:
+            with self.subTest(endpoint=endpoint.name):
+                response, queries, _ = endpoint.request(self.client,
+                                                        self.context)
+                if endpoint.status is None:
+                    self.assertLess(response.status_code,
+                                    HTTPStatus.BAD_REQUEST)
+                else:
+                    self.assertEqual(response.status_code, endpoint.status)
+                self.assertLessEqual(queries, endpoint.budget)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_queries_do_not_depend_on_page_size(self):
+        for endpoint in ENDPOINTS:
+            if not endpoint.paginated:
+                continue
+            with self.subTest(endpoint=endpoint.name):
+                endpoint.request(self.client, self.context, limit=1)
+                _, small_page, _ = endpoint.request(self.client,
+                                                    self.context, limit=1)
+                _, large_page, _ = endpoint.request(self.client,
+                                                    self.context, limit=10)
+                self.assertEqual(small_page, large_page)
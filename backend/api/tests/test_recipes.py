@@ -0,0 +1,784 @@
+import json
+import time
+from base64 import urlsafe_b64encode
+from datetime import timedelta
+from http import HTTPStatus
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, Follow, Ingredient, Recipe,
+                            RecipeIngredient, RecipeSimilarity, ShoppingCart,
+                            Tag)
+from recipes import workers
+from recipes.search import refresh_search_documents
+from ..cache import recipe_response_cache
+from ..renderers import ShoppingCartPDFRenderer
+from ..row_serializers import RECIPE_FIELDS, RecipeRowSerializer
+from ..serializers import RecipeCreateUpdateSerializer, RecipeSerializer
+
+User = get_user_model()
+
+
+def run_tasks_inline():
+    """Задачи пула выполняются сразу, в потоке и транзакции теста"""
+    return mock.patch.object(workers.executor, 'submit',
+                             lambda task, func, *args: func(*args))
+
+
+class RecipesAPITestCase(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_list_exists(self):
+        """Проверка доступности рецептов."""
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+
+class RecipesQueriesTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='user',
+                                       email='user@foodgram.ru')
+        cls.tag = Tag.objects.create(name='Завтрак', slug='breakfast')
+        cls.ingredient = Ingredient.objects.create(name='Соль',
+                                                   measurement_unit='г')
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipes(self, count):
+        start = Recipe.objects.count()
+        for number in range(start, start + count):
+            author = User.objects.create(username=f'author{number}',
+                                         email=f'author{number}@foodgram.ru')
+            recipe = Recipe.objects.create(author=author,
+                                           name=f'Рецепт {number}',
+                                           text='Описание',
+                                           cooking_time=10,
+                                           image='recipes/images/temp.png')
+            recipe.tags.set([self.tag])
+            RecipeIngredient.objects.create(recipe=recipe,
+                                            ingredient=self.ingredient,
+                                            amount=5)
+            Favorite.objects.create(user=self.user, recipe=recipe)
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+            Follow.objects.create(user=self.user, following=author)
+
+    def test_recipes_list_queries_do_not_depend_on_page_size(self):
+        """Число запросов к списку рецептов не зависит от их количества."""
+        self.create_recipes(1)
+        with self.assertNumQueries(8):
+            self.client.get('/api/recipes/')
+        with self.assertNumQueries(5):
+            self.client.get('/api/recipes/')
+        self.create_recipes(5)
+        self.client.get('/api/recipes/')
+        with self.assertNumQueries(5):
+            response = self.client.get('/api/recipes/')
+        recipe = response.data['results'][0]
+        self.assertTrue(recipe['is_favorited'])
+        self.assertTrue(recipe['is_in_shopping_cart'])
+        self.assertTrue(recipe['author']['is_subscribed'])
+        self.assertEqual(recipe['ingredients'][0]['id'], self.ingredient.id)
+
+    def test_recipe_filters_queries_and_duplicates(self):
+        """Фильтры не множат строки и не добавляют запросов."""
+        self.create_recipes(3)
+        lunch = Tag.objects.create(name='Обед', slug='lunch')
+        recipe = Recipe.objects.first()
+        recipe.tags.add(lunch)
+        Favorite.objects.filter(recipe=recipe).delete()
+        self.client.get('/api/recipes/', {'tags': 'lunch'})
+        for params, expected_count, queries in (
+                ({'tags': ['breakfast', 'lunch']}, 3, 5),
+                ({'tags': 'lunch'}, 1, 5),
+                ({'is_favorited': 1}, 2, 5),
+                ({'is_favorited': 0}, 1, 5),
+                ({'is_in_shopping_cart': 1, 'tags': 'breakfast'}, 3, 5),
+                ({'author': recipe.author.id, 'is_favorited': 0}, 1, 6),
+                ({'author': recipe.author.id, 'is_favorited': 1}, 0, 2)):
+            with self.subTest(params=params):
+                with self.assertNumQueries(queries):
+                    response = self.client.get('/api/recipes/', params)
+                self.assertEqual(response.data['count'], expected_count)
+                self.assertEqual(len(response.data['results']),
+                                 expected_count)
+        response = self.client.get('/api/recipes/', {'tags': 'unknown'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_recipes_cursor_pagination(self):
+        """Курсорный режим проходит ленту без OFFSET и COUNT(*)."""
+        self.create_recipes(7)
+        expected = list(Recipe.objects.values_list('id', flat=True))
+        url = '/api/recipes/?pagination=cursor&limit=3'
+        self.client.get(url)
+        received = []
+        while url:
+            with self.assertNumQueries(4):
+                response = self.client.get(url)
+            self.assertNotIn('count', response.data)
+            received += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(received, expected)
+        for values in (['abc', 'x'], [str(timezone.now()), 'x'],
+                       [None, 1], [[], {}], 'abc'):
+            cursor = urlsafe_b64encode(json.dumps(values).encode()).decode()
+            response = self.client.get(
+                '/api/recipes/', {'pagination': 'cursor', 'cursor': cursor})
+            self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        response = self.client.get(
+            '/api/users/subscriptions/?pagination=cursor&limit=5&count=1')
+        self.assertEqual(response.data['count'], 7)
+        self.assertEqual(len(response.data['results']), 5)
+
+    def test_subscriptions_queries_do_not_depend_on_follows_count(self):
+        """Подписки пагинируются до сериализации."""
+        self.create_recipes(2)
+        with self.assertNumQueries(3):
+            self.client.get('/api/users/subscriptions/')
+        self.create_recipes(10)
+        first_author = User.objects.get(username='author0')
+        for number in range(2):
+            Recipe.objects.create(author=first_author,
+                                  name=f'Еще рецепт {number}',
+                                  text='Описание',
+                                  cooking_time=10,
+                                  image='recipes/images/temp.png')
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                '/api/users/subscriptions/?limit=5&recipes_limit=2')
+        self.assertEqual(response.data['count'], 12)
+        self.assertEqual(len(response.data['results']), 5)
+        author = response.data['results'][0]
+        self.assertEqual(author['recipes_count'], 3)
+        self.assertEqual([recipe['name'] for recipe in author['recipes']],
+                         ['Еще рецепт 1', 'Еще рецепт 0'])
+        response = self.client.get(
+            '/api/users/subscriptions/?recipes_limit=0')
+        self.assertEqual(response.data['results'][0]['recipes'], [])
+        other = User.objects.create(username='other',
+                                    email='other@foodgram.ru')
+        for recipes_limit in ('x', '-1'):
+            response = self.client.get(
+                '/api/users/subscriptions/',
+                {'recipes_limit': recipes_limit})
+            self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+            response = self.client.post(
+                f'/api/users/{other.id}/subscribe/?recipes_limit='
+                f'{recipes_limit}')
+            self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertFalse(Follow.objects.filter(following=other).exists())
+
+    def test_download_shopping_cart_formats(self):
+        """Список покупок собирается одним запросом в каждом формате."""
+        self.create_recipes(2)
+        url = '/api/recipes/download_shopping_cart/'
+        with self.assertNumQueries(1):
+            response = self.client.get(url)
+            content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content, 'Список покупок\n   - Соль (г) - 10\n')
+        with self.assertNumQueries(1):
+            response = self.client.get(url, {'format': 'csv'})
+            content = b''.join(response.streaming_content).decode()
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertEqual(content,
+                         'name,measurement_unit,amount\r\nСоль,г,10\r\n')
+        response = self.client.get(url, {'format': 'pdf'})
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(
+            b''.join(response.streaming_content).startswith(b'%PDF'))
+        renderer = ShoppingCartPDFRenderer()
+        renderer.font_name = 'MissingShoppingCartFont'
+        with self.settings(SHOPPING_CART_PDF_FONT='/nonexistent/font.ttf'):
+            with self.assertLogs('api.renderers', 'ERROR'):
+                with self.assertRaises(ImproperlyConfigured):
+                    renderer.stream(iter(()))
+
+    def test_download_empty_shopping_cart(self):
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertEqual(b''.join(response.streaming_content).decode(),
+                         'Список покупок ПУСТ')
+
+    def test_shopping_cart_totals_follow_cart_and_recipe_changes(self):
+        """Суммы Списка покупок пересчитываются при изменениях."""
+        self.create_recipes(1)
+        recipe = Recipe.objects.get()
+        pepper = Ingredient.objects.create(name='Перец', measurement_unit='г')
+        self.client.force_authenticate(recipe.author)
+        response = self.client.patch(
+            f'/api/recipes/{recipe.id}/',
+            {'ingredients': [{'id': self.ingredient.id, 'amount': 7},
+                             {'id': pepper.id, 'amount': 2}]},
+            format='json')
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(
+            dict(self.user.shopping_cart_ingredients.values_list(
+                'ingredient', 'total_amount')),
+            {self.ingredient.id: 7, pepper.id: 2})
+        self.client.force_authenticate(self.user)
+        self.client.delete(f'/api/recipes/{recipe.id}/shopping_cart/')
+        self.assertFalse(self.user.shopping_cart_ingredients.exists())
+        self.client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        self.assertEqual(self.user.shopping_cart_ingredients.count(), 2)
+        ShoppingCart.objects.filter(user=self.user).delete()
+        self.assertFalse(self.user.shopping_cart_ingredients.exists())
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        self.assertEqual(self.user.shopping_cart_ingredients.count(), 2)
+        recipe.delete()
+        self.assertFalse(self.user.shopping_cart_ingredients.exists())
+
+    def test_recipe_update_changes_only_differing_rows(self):
+        """Редактирование меняет только отличающиеся строки рецепта."""
+        self.create_recipes(1)
+        recipe = Recipe.objects.get()
+        pepper = Ingredient.objects.create(name='Перец', measurement_unit='г')
+        row = recipe.ingredients_in_recipe.get()
+        self.client.force_authenticate(recipe.author)
+        url = f'/api/recipes/{recipe.id}/'
+        response = self.client.patch(url, {'name': 'Новое название'},
+                                     format='json')
+        self.assertEqual(response.data['name'], 'Новое название')
+        data = {'ingredients': [{'id': self.ingredient.id, 'amount': 5}],
+                'tags': [self.tag.id]}
+        with CaptureQueriesContext(connection) as queries:
+            self.client.patch(url, data, format='json')
+        writes = [query['sql'] for query in queries.captured_queries
+                  if not query['sql'].startswith(('SELECT', 'SAVEPOINT',
+                                                  'RELEASE'))]
+        self.assertEqual(len(writes), 1, writes)
+        self.assertTrue(writes[0].startswith('UPDATE "recipes_recipe"'))
+        data['ingredients'].append({'id': pepper.id, 'amount': 2})
+        self.client.patch(url, data, format='json')
+        self.assertEqual(recipe.ingredients_in_recipe.get(
+            ingredient=self.ingredient).pk, row.pk)
+        self.assertEqual(
+            dict(self.user.shopping_cart_ingredients.values_list(
+                'ingredient', 'total_amount')),
+            {self.ingredient.id: 5, pepper.id: 2})
+        response = self.client.get('/api/recipes/', {'search': 'перец'})
+        self.assertEqual(response.data['count'], 1)
+
+    def test_recipe_write_validation_queries_are_batched(self):
+        """Ингредиенты и тэги проверяются одним запросом на список."""
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+            for number in range(30))
+        Tag.objects.bulk_create(
+            Tag(name=f'Тэг {number}', slug=f'tag{number}')
+            for number in range(5))
+        ingredients = list(Ingredient.objects.all())
+        tag_ids = list(Tag.objects.values_list('pk', flat=True))
+        queries = []
+        for count in (1, 30):
+            serializer = RecipeCreateUpdateSerializer(data={
+                'ingredients': [{'id': ingredient.pk, 'amount': 1}
+                                for ingredient in ingredients[:count]],
+                'tags': tag_ids[:count],
+                'name': 'Рецепт',
+                'text': 'Описание',
+                'cooking_time': 1})
+            with CaptureQueriesContext(connection) as captured:
+                serializer.is_valid()
+            self.assertNotIn('ingredients', serializer.errors)
+            self.assertNotIn('tags', serializer.errors)
+            queries.append(len(captured))
+        self.assertEqual(queries[0], queries[1])
+        self.assertEqual(queries[0], 2)
+        serializer = RecipeCreateUpdateSerializer(data={
+            'ingredients': [{'id': 0, 'amount': 1},
+                            {'id': ingredients[0].pk, 'amount': 1},
+                            {'id': -1, 'amount': 1}],
+            'tags': [tag_ids[0], 0, -1]})
+        with CaptureQueriesContext(connection) as captured:
+            serializer.is_valid()
+        self.assertEqual(len(captured), 2)
+        errors = serializer.errors['ingredients']
+        self.assertIn('0', str(errors[0]['id']))
+        self.assertEqual(errors[1], {})
+        self.assertIn('-1', str(errors[2]['id']))
+        self.assertIn('0, -1', str(serializer.errors['tags']))
+
+    def test_counters_follow_changes_and_reconcile(self):
+        """Счетчики меняются вместе с данными и сверяются командой."""
+        self.create_recipes(2)
+        recipe = Recipe.objects.first()
+        author = recipe.author
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual((author.recipes_count, author.followers_count),
+                         (1, 1))
+        self.client.delete(f'/api/recipes/{recipe.id}/favorite/')
+        self.client.delete(f'/api/users/{author.id}/subscribe/')
+        recipe.refresh_from_db()
+        author.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+        self.assertEqual(author.followers_count, 0)
+        response = self.client.get('/api/users/subscriptions/')
+        self.assertEqual(response.data['results'][0]['recipes_count'], 1)
+        Recipe.objects.filter(pk=recipe.pk).update(favorites_count=5)
+        User.objects.filter(pk=author.pk).update(recipes_count=0)
+        with self.assertRaises(CommandError):
+            call_command('reconcile_counters', '--check', stdout=StringIO())
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('Recipe.favorites_count: 1', out.getvalue())
+        self.assertIn('User.recipes_count: 1', out.getvalue())
+        recipe.refresh_from_db()
+        author.refresh_from_db()
+        self.assertEqual((recipe.favorites_count, author.recipes_count),
+                         (0, 1))
+        recipe.delete()
+        author.refresh_from_db()
+        self.assertEqual(author.recipes_count, 0)
+
+    def test_recipes_ordering_by_scores(self):
+        """Сортировки по популярности берутся из таблицы оценок."""
+        self.create_recipes(3)
+        first, second, third = Recipe.objects.order_by('pk')
+        users = [User.objects.create(username=f'fan{number}',
+                                     email=f'fan{number}@foodgram.ru')
+                 for number in range(3)]
+        for user in users:
+            Favorite.objects.create(user=user, recipe=first)
+        for user in users[:2]:
+            ShoppingCart.objects.create(user=user, recipe=second)
+        Favorite.objects.filter(recipe=first).update(
+            created=timezone.now() - timedelta(days=20))
+        call_command('refresh_recipe_scores', stdout=StringIO())
+        fresh = Recipe.objects.create(author=self.user, name='Новый',
+                                      text='Описание', cooking_time=1,
+                                      image='recipes/images/temp.png')
+        self.client.get('/api/recipes/')
+        for ordering, expected in (
+                ('favorites', [first, third, second, fresh]),
+                ('shopping_cart', [second, third, first, fresh]),
+                ('trending', [second, third, first, fresh])):
+            with self.subTest(ordering=ordering):
+                with self.assertNumQueries(5):
+                    response = self.client.get(
+                        '/api/recipes/', {'ordering': ordering})
+                self.assertEqual(
+                    [recipe['id'] for recipe in response.data['results']],
+                    [recipe.pk for recipe in expected])
+        response = self.client.get(
+            '/api/recipes/', {'ordering': 'trending', 'pagination': 'cursor'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_feed_follows_subscriptions(self):
+        """Лента подписок пополняется при публикации и подписке."""
+        self.create_recipes(3)
+        other = User.objects.create(username='other',
+                                    email='other@foodgram.ru')
+        Recipe.objects.create(author=other, name='Чужой', text='Описание',
+                              cooking_time=1, image='recipes/images/temp.png')
+        expected = list(Recipe.objects.exclude(author=other).values_list(
+            'id', flat=True))
+
+        def get_feed_ids(limit=2):
+            url, ids = f'/api/recipes/feed/?limit={limit}', []
+            self.client.get(url)
+            while url:
+                with self.assertNumQueries(6):
+                    response = self.client.get(url)
+                ids += [recipe['id'] for recipe in response.data['results']]
+                url = response.data['next']
+            return ids
+
+        self.assertEqual(get_feed_ids(), expected)
+        author = Recipe.objects.get(pk=expected[0]).author
+        recipe = Recipe.objects.create(author=author, name='Новый',
+                                       text='Описание', cooking_time=1,
+                                       image='recipes/images/temp.png')
+        self.assertEqual(get_feed_ids(), [recipe.pk] + expected)
+        self.client.post(f'/api/users/{other.id}/subscribe/')
+        self.client.delete(f'/api/users/{author.id}/subscribe/')
+        feed = get_feed_ids()
+        self.assertIn(Recipe.objects.get(author=other).pk, feed)
+        self.assertNotIn(recipe.pk, feed)
+        with self.settings(FEED_FANOUT_LIMIT=0):
+            Follow.objects.create(user=self.user, following=author)
+            recipe = Recipe.objects.create(author=author, name='Еще',
+                                           text='Описание', cooking_time=1,
+                                           image='recipes/images/temp.png')
+            self.assertFalse(recipe.feed_entries.exists())
+            self.assertEqual(get_feed_ids(5)[0], recipe.pk)
+        call_command('rebuild_feed', stdout=StringIO())
+        self.assertEqual(get_feed_ids(5)[0], recipe.pk)
+        with self.settings(FEED_FANOUT_LIMIT=1):
+            Follow.objects.create(user=other, following=author)
+            author.refresh_from_db()
+            recipe = Recipe.objects.create(author=author, name='Еще один',
+                                           text='Описание', cooking_time=1,
+                                           image='recipes/images/temp.png')
+            self.assertFalse(recipe.feed_entries.exists())
+            with self.captureOnCommitCallbacks(execute=True):
+                Follow.objects.filter(user=other, following=author).delete()
+            self.assertTrue(recipe.feed_entries.filter(
+                user=self.user).exists())
+            self.assertEqual(get_feed_ids(5)[0], recipe.pk)
+
+    def test_similar_recipes_are_refreshed_incrementally(self):
+        """Похожие рецепты после правки совпадают с полным пересчетом."""
+        self.create_recipes(4)
+        first, second, third, fourth = Recipe.objects.order_by('pk')
+        pepper, onion, garlic = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Перец', 'Лук', 'Чеснок'))
+        for recipe, ingredients in ((first, [pepper]),
+                                    (second, [pepper, onion]),
+                                    (third, [onion, garlic])):
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=1) for ingredient in ingredients)
+        call_command('build_similarities', stdout=StringIO())
+
+        def get_similarities():
+            return {(recipe_id, similar_id, round(score, 5))
+                    for recipe_id, similar_id, score in
+                    RecipeSimilarity.objects.values_list(
+                        'recipe', 'similar', 'score')}
+
+        with self.assertNumQueries(2):
+            response = self.client.get(f'/api/recipes/{first.id}/similar/')
+        self.assertEqual([recipe['id'] for recipe in response.data],
+                         [second.id, fourth.id, third.id])
+        before = get_similarities()
+        self.client.force_authenticate(fourth.author)
+        data = {'ingredients': [{'id': self.ingredient.id, 'amount': 5},
+                                {'id': garlic.id, 'amount': 1}],
+                'tags': [self.tag.id]}
+        with run_tasks_inline(), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f'/api/recipes/{fourth.id}/', data,
+                              format='json')
+        refreshed = get_similarities()
+        self.assertNotEqual(refreshed, before)
+        call_command('build_similarities', stdout=StringIO())
+        self.assertEqual(refreshed, get_similarities())
+        response = self.client.get(f'/api/recipes/{fourth.id}/similar/')
+        self.assertEqual(response.data[0]['id'], third.id)
+        response = self.client.get('/api/recipes/0/similar/')
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        with override_settings(SIMILAR_RECIPES_TOP_K=1):
+            call_command('build_similarities', stdout=StringIO())
+            self.assertIn((fourth.id, third.id),
+                          {pair[:2] for pair in get_similarities()})
+            with run_tasks_inline(), \
+                    self.captureOnCommitCallbacks(execute=True):
+                third.delete()
+            # Число рецептов изменилось, поэтому сравниваются только пары:
+            # близости остальных рецептов обновит полный пересчет.
+            refreshed = {pair[:2] for pair in get_similarities()}
+            call_command('build_similarities', stdout=StringIO())
+            self.assertEqual(refreshed,
+                             {pair[:2] for pair in get_similarities()})
+
+    def test_pantry_ranks_recipes_by_coverage(self):
+        """Рецепты ранжируются по доле ингредиентов, которые есть."""
+        self.create_recipes(3)
+        first, second, third = Recipe.objects.order_by('pk')
+        pepper, onion = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Перец', 'Лук'))
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=first, ingredient=pepper, amount=1),
+            RecipeIngredient(recipe=second, ingredient=pepper, amount=1),
+            RecipeIngredient(recipe=second, ingredient=onion, amount=1)])
+        third.save()
+
+        def get_pantry(ingredients, **params):
+            response = self.client.get('/api/recipes/pantry/', {
+                'ingredients': [ingredient.id for ingredient in ingredients],
+                **params})
+            return [(recipe['id'], recipe['coverage'], recipe['missing'])
+                    for recipe in response.data['results']]
+
+        self.assertEqual(get_pantry([self.ingredient]),
+                         [(third.id, 1, 0), (first.id, 0.5, 1),
+                          (second.id, 0.3333, 2)])
+        self.assertEqual(get_pantry([self.ingredient, pepper],
+                                    max_missing=0),
+                         [(third.id, 1, 0), (first.id, 1, 0)])
+        self.assertEqual(get_pantry([onion], limit=1),
+                         [(second.id, 0.3333, 2)])
+        recipe = Recipe.objects.create(author=self.user, name='Новый',
+                                       text='Описание', cooking_time=1,
+                                       image='recipes/images/temp.png')
+        RecipeIngredient.objects.create(recipe=recipe, ingredient=onion,
+                                        amount=1)
+        with self.assertNumQueries(6):
+            self.assertEqual(get_pantry([onion]),
+                             [(recipe.id, 1, 0), (second.id, 0.3333, 2)])
+        with self.assertNumQueries(4):
+            get_pantry([onion])
+        response = self.client.get('/api/recipes/pantry/')
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_viewer_state_is_loaded_once_and_invalidated(self):
+        """Флаги пользователя берутся из множеств, загруженных один раз."""
+        self.create_recipes(2)
+        recipe = Recipe.objects.first()
+        self.client.get('/api/users/')
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/users/')
+        self.assertEqual(
+            {user['id'] for user in response.data['results']
+             if user['is_subscribed']},
+            set(self.user.follower.values_list('following', flat=True)))
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/users/me/')
+        self.assertFalse(response.data['is_subscribed'])
+        self.client.delete(f'/api/recipes/{recipe.id}/favorite/')
+        self.client.delete(f'/api/users/{recipe.author_id}/subscribe/')
+        response = self.client.get(f'/api/recipes/{recipe.id}/')
+        self.assertFalse(response.data['is_favorited'])
+        self.assertTrue(response.data['is_in_shopping_cart'])
+        self.assertFalse(response.data['author']['is_subscribed'])
+
+    def test_conditional_get_skips_serialization(self):
+        """Детальные рецепт и пользователь отдают 304 по ETag."""
+        self.create_recipes(1)
+        recipe = Recipe.objects.get()
+        url = f'/api/recipes/{recipe.id}/'
+        self.client.get(url)
+        with self.assertNumQueries(3):
+            response = self.client.get(url)
+        etag = response['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.assertNotIn('Last-Modified', response)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 60))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.client.delete(f'{url}favorite/')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertFalse(response.data['is_favorited'])
+        etag = response['ETag']
+        updated_at = Recipe.objects.get().updated_at
+        self.client.force_authenticate(recipe.author)
+        self.client.patch(url, {'ingredients': [
+            {'id': self.ingredient.id, 'amount': 7}],
+            'tags': [self.tag.id]}, format='json')
+        self.assertGreater(Recipe.objects.get().updated_at, updated_at)
+        self.client.force_authenticate(self.user)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.data['ingredients'][0]['amount'], 7)
+
+        url = f'/api/users/{recipe.author_id}/'
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        User.objects.filter(pk=recipe.author_id).update(first_name='Иван')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.data['first_name'], 'Иван')
+
+    def test_row_serializer_matches_recipe_serializer(self):
+        """Быстрый вывод списка и рецепта совпадает с RecipeSerializer."""
+        self.create_recipes(3)
+        other_tag = Tag.objects.create(name='Обед', slug='lunch')
+        other_ingredient = Ingredient.objects.create(name='Мука',
+                                                     measurement_unit='кг')
+        recipe = Recipe.objects.order_by('id').first()
+        recipe.tags.add(other_tag)
+        RecipeIngredient.objects.create(recipe=recipe,
+                                        ingredient=other_ingredient,
+                                        amount=2)
+        Recipe.objects.filter(pk=recipe.pk).update(image_variants={
+            'small': {'webp': 'recipes/images/small/temp.webp',
+                      'jpeg': 'recipes/images/small/temp.jpeg'}})
+        Favorite.objects.filter(recipe=recipe).delete()
+        Follow.objects.create(user=recipe.author, following=self.user)
+        Recipe.objects.create(author=self.user, name='Без картинки',
+                              text='Описание', cooking_time=1)
+        anonymous = APIClient()
+
+        def render(response, instance, many=False):
+            serializer = RecipeSerializer(
+                instance, many=many,
+                context={'request': response.wsgi_request})
+            return JSONRenderer().render(serializer.data)
+
+        recipes = Recipe.objects.with_relations().order_by('-pub_date', '-id')
+        for client in (self.client, anonymous):
+            cache.clear()
+            response = client.get('/api/recipes/')
+            self.assertEqual(
+                JSONRenderer().render(response.data['results']),
+                render(response, recipes, many=True))
+            response = client.get(f'/api/recipes/{recipe.pk}/')
+            self.assertEqual(response.content,
+                             render(response, recipes.get(pk=recipe.pk)))
+        response = self.client.get('/api/recipes/feed/')
+        self.assertEqual(
+            JSONRenderer().render(response.data['results']),
+            render(response, recipes.filter(author__following__user=self.user),
+                   many=True))
+        rows = RecipeRowSerializer(
+            Recipe.objects.values(*RECIPE_FIELDS), many=True).data
+        self.assertEqual(len(rows), recipes.count())
+        self.assertFalse(any(
+            row['is_favorited'] or row['is_in_shopping_cart']
+            or row['author']['is_subscribed'] for row in rows))
+
+
+class CatalogCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+
+    def test_catalog_is_cached_and_invalidated(self):
+        """Справочник кэшируется, отдает 304 и сбрасывается сигналами."""
+        response = self.client.get('/api/ingredients/')
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/ingredients/')
+        self.assertEqual(len(response.data), 1)
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/ingredients/',
+                                       HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        Ingredient.objects.create(name='Перец', measurement_unit='г')
+        response = self.client.get('/api/ingredients/',
+                                   HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(len(response.data), 2)
+
+    def test_ingredient_search_ranks_prefix_matches_first(self):
+        """Совпадения по началу названия идут раньше совпадений внутри."""
+        for name in ('Морская соль', 'Сахар', 'Солод'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+        response = self.client.get('/api/ingredients/', {'name': 'сол'})
+        self.assertEqual([ingredient['name'] for ingredient in response.data],
+                         ['Солод', 'Соль', 'Морская соль'])
+
+    @override_settings(INGREDIENT_SEARCH_LIMIT=2)
+    def test_ingredient_search_is_limited(self):
+        """Выдача поиска обрезается до INGREDIENT_SEARCH_LIMIT."""
+        for name in ('Морская соль', 'Солод'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+        response = self.client.get('/api/ingredients/', {'name': 'сол'})
+        self.assertEqual([ingredient['name'] for ingredient in response.data],
+                         ['Солод', 'Соль'])
+
+
+class RecipeSearchTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        author = User.objects.create(username='author',
+                                     email='author@foodgram.ru')
+        beet = Ingredient.objects.create(name='Свёкла', measurement_unit='г')
+        recipes = []
+        for name, text in (('Салат', 'Подается к борщу'),
+                           ('Борщ', 'Классический'),
+                           ('Омлет', 'На завтрак')):
+            recipes.append(Recipe.objects.create(
+                author=author, name=name, text=text, cooking_time=10,
+                image='recipes/images/temp.png'))
+        RecipeIngredient.objects.create(recipe=recipes[1], ingredient=beet,
+                                        amount=1)
+        refresh_search_documents(recipe.pk for recipe in recipes)
+
+    def search(self, query):
+        response = self.client.get('/api/recipes/', {'search': query})
+        return [recipe['name'] for recipe in response.data['results']]
+
+    def test_search_ranks_name_matches_first(self):
+        """Совпадение в названии важнее совпадения в описании."""
+        self.assertEqual(self.search('борщ'), ['Борщ', 'Салат'])
+
+    def test_search_by_ingredient_name(self):
+        self.assertEqual(self.search('СВЕКЛА'), ['Борщ'])
+        self.assertEqual(self.search('???'), [])
+
+    @skipUnless(connection.vendor == 'postgresql',
+                'Синтаксис websearch есть только в PostgreSQL')
+    def test_search_supports_websearch_syntax(self):
+        self.assertEqual(self.search('борщ -салат'), ['Борщ'])
+        self.assertEqual(sorted(self.search('омлет or салат')),
+                         ['Омлет', 'Салат'])
+
+
+class RecipeResponseCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.author = User.objects.create(username='author',
+                                          email='author@foodgram.ru')
+        Tag.objects.bulk_create([Tag(name='Завтрак', slug='breakfast'),
+                                 Tag(name='Обед', slug='lunch')])
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Омлет', text='Описание',
+            cooking_time=10, image='recipes/images/temp.png')
+
+    def test_anonymous_responses_are_cached_by_generation(self):
+        """Анонимные ответы кэшируются и сбрасываются записью рецептов."""
+        response = self.client.get('/api/recipes/',
+                                   {'tags': ['lunch', 'breakfast']})
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('stale-while-revalidate', response['Cache-Control'])
+        self.assertIn('Authorization', response['Vary'])
+        with self.assertNumQueries(0):
+            cached = self.client.get('/api/recipes/?page=1&tags=breakfast'
+                                     '&tags=lunch')
+        self.assertEqual(cached.data, response.data)
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                '/api/recipes/', {'tags': ['breakfast', 'lunch']},
+                HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        self.client.get('/api/recipes/', {'search': 'омлет'})
+        self.client.force_authenticate(self.author)
+        self.client.get('/api/recipes/')
+        self.client.force_authenticate(None)
+
+        self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.recipe.name = 'Яичница'
+        self.recipe.save()
+        key = f'testserver/api/recipes/{self.recipe.id}/?'
+        lock_key = recipe_response_cache.get_key(key) + ':lock'
+        cache.add(lock_key, True)
+        with self.assertNumQueries(0):
+            response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.data['name'], 'Омлет')
+        cache.delete(lock_key)
+        response = self.client.get(f'/api/recipes/{self.recipe.id}/')
+        self.assertEqual(response.data['name'], 'Яичница')
+        self.assertEqual(recipe_response_cache.get_stats(),
+                         {'hit': 2, 'stale': 1, 'miss': 3})
+        out = StringIO()
+        call_command('response_cache_stats', '--reset', stdout=out)
+        self.assertIn('50.0%', out.getvalue())
+        self.assertEqual(recipe_response_cache.get_stats(),
+                         {'hit': 0, 'stale': 0, 'miss': 0})
+
+    def test_author_profile_change_invalidates_responses(self):
+        """Смена профиля автора сбрасывает закэшированные рецепты."""
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.client.get(url)
+        version = recipe_response_cache.get_version()
+        self.author.refresh_from_db()
+        self.author.last_login = timezone.now()
+        self.author.save(update_fields=['last_login'])
+        self.assertEqual(recipe_response_cache.get_version(), version)
+        self.author.first_name = 'Иван'
+        self.author.save()
+        response = self.client.get(url)
+        self.assertEqual(response.data['author']['first_name'], 'Иван')
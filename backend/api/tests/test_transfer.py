@@ -0,0 +1,155 @@
+import csv
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.test import TestCase
+
+from recipes.models import (FeedEntry, Ingredient, Recipe,
+                            RecipeSearchDocument, RecipeSimilarity,
+                            ShoppingCartIngredient)
+from recipes.services import get_shopping_cart_totals, reconcile_counters
+from ..benchmarks.factories import create_dataset
+
+
+class RecipeTransferTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_dataset(users=5, recipes=12, ingredients=20, tags=3,
+                       ingredients_per_recipe=3, follows=1, favorites=1,
+                       carts=2)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+
+    def export(self, name):
+        path = os.path.join(self.directory, name)
+        call_command('export_recipes', path, '--batch-size=5',
+                     stdout=StringIO())
+        return path
+
+    def read(self, path):
+        with open(path, encoding='utf-8') as file:
+            return file.read()
+
+    def get_derived_state(self):
+        """Ленты и похожие рецепты с рецептами по названию"""
+        return (
+            set(FeedEntry.objects.values_list('user', 'recipe__name')),
+            set(RecipeSimilarity.objects.values_list('recipe__name',
+                                                     'similar__name')))
+
+    def test_export_import_round_trip(self):
+        derived = self.get_derived_state()
+        self.assertTrue(all(derived))
+        for name in ('recipes.jsonl', 'recipes.csv'):
+            with self.subTest(name=name):
+                path = self.export(name)
+                exported = self.read(path)
+                Recipe.objects.all().delete()
+                out = StringIO()
+                call_command('import_recipes', path, '--batch-size=5',
+                             stdout=out, stderr=StringIO())
+                self.assertIn('Создано: 12, обновлено: 0', out.getvalue())
+                self.assertEqual(self.read(self.export(name)), exported)
+                self.assertEqual(RecipeSearchDocument.objects.count(), 12)
+                self.assertEqual(self.get_derived_state(), derived)
+                self.assertFalse(any(
+                    reconcile_counters(dry_run=True).values()))
+
+    def test_import_skips_malformed_rows(self):
+        path = self.export('recipes.jsonl')
+        with open(path, 'a', encoding='utf-8') as file:
+            file.write('{"author": \n')
+            file.write('["not", "a", "record"]\n')
+        err = StringIO()
+        out = StringIO()
+        call_command('import_recipes', path, '--batch-size=5',
+                     stdout=out, stderr=err)
+        self.assertIn('обновлено: 12, пропущено: 2', out.getvalue())
+        self.assertIn('Строка 14', err.getvalue())
+        path = self.export('recipes.csv')
+        with open(path, encoding='utf-8', newline='') as file:
+            rows = list(csv.DictReader(file))
+        rows[0]['cooking_time'] = 'abc'
+        rows[1]['tags'] = '['
+        with open(path, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.DictWriter(file, rows[0].keys())
+            writer.writeheader()
+            writer.writerows(rows)
+        out = StringIO()
+        call_command('import_recipes', path, stdout=out, stderr=StringIO())
+        self.assertIn('обновлено: 10, пропущено: 2', out.getvalue())
+
+    def test_import_skips_invalid_values(self):
+        path = self.export('recipes.jsonl')
+        record = json.loads(self.read(path).splitlines()[0])
+        amount = record['ingredients'][0]['amount']
+        invalid = [{'cooking_time': 'abc'}, {'cooking_time': 0},
+                   {'name': None}, {'text': ''}, {'tags': 'breakfast'},
+                   {'ingredients': {}}]
+        invalid += [{'ingredients': [{**record['ingredients'][0],
+                                      'amount': value}]}
+                    for value in ('x', -5, 0)]
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(json.dumps({**record, 'cooking_time': 7}) + '\n')
+            file.writelines(
+                json.dumps({**record, 'name': f'Плохой {number}', **values})
+                + '\n' for number, values in enumerate(invalid))
+        Recipe.objects.all().delete()
+        out, err = StringIO(), StringIO()
+        call_command('import_recipes', path, stdout=out, stderr=err)
+        self.assertIn(f'Создано: 1, обновлено: 0, пропущено: {len(invalid)}',
+                      out.getvalue())
+        self.assertIn(f'Строка {len(invalid) + 1}', err.getvalue())
+        recipe = Recipe.objects.get()
+        self.assertEqual((recipe.name, recipe.cooking_time),
+                         (record['name'], 7))
+        self.assertEqual(
+            list(recipe.ingredients_in_recipe.values_list('amount',
+                                                          flat=True))[:1],
+            [amount])
+
+    def test_import_updates_existing_recipes(self):
+        path = self.export('recipes.jsonl')
+        records = [json.loads(line) for line in self.read(path).splitlines()]
+        for record in records:
+            record['cooking_time'] = 1
+            record['ingredients'] = record['ingredients'][:1]
+        records.append({**records[0], 'author': 'unknown'})
+        with open(path, 'w', encoding='utf-8') as file:
+            file.writelines(json.dumps(record) + '\n' for record in records)
+        out, err = StringIO(), StringIO()
+        call_command('import_recipes', path, '--batch-size=5',
+                     stdout=out, stderr=err)
+        self.assertIn('Создано: 0, обновлено: 12, пропущено: 1',
+                      out.getvalue())
+        self.assertIn('Строка 13', err.getvalue())
+        self.assertEqual(Recipe.objects.count(), 12)
+        self.assertFalse(Recipe.objects.exclude(cooking_time=1).exists())
+        self.assertEqual(
+            sorted(ShoppingCartIngredient.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount')),
+            sorted(get_shopping_cart_totals()))
+
+
+class IngredientsUploadTestCase(TestCase):
+
+    def test_upload_is_idempotent_for_csv_and_json(self):
+        out = StringIO()
+        call_command('ingredients_upload_db', '--batch-size=500', stdout=out)
+        count = Ingredient.objects.count()
+        self.assertGreater(count, 0)
+        self.assertIn(f'добавлено: {count}', out.getvalue())
+        json_path = str(settings.BASE_DIR / 'static/data/ingredients.json')
+        out = StringIO()
+        call_command('ingredients_upload_db', f'--path={json_path}',
+                     stdout=out)
+        self.assertIn('добавлено: 0', out.getvalue())
+        self.assertEqual(Ingredient.objects.count(), count)
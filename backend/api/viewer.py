@@ -0,0 +1,86 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import transaction
+
+from recipes.models import Favorite, Follow, ShoppingCart
+
+VIEWER_SETS = {
+    'following': (Follow, 'following_id'),
+    'favorites': (Favorite, 'recipe_id'),
+    'shopping_cart': (ShoppingCart, 'recipe_id'),
+}
+
+
+def get_version_key(user_id):
+    return f'viewer:{user_id}:version'
+
+
+def invalidate_viewer_state(user_id):
+    """Сбрасывает кэш сразу и еще раз после коммита транзакции"""
+    key = get_version_key(user_id)
+    cache.set(key, time.time_ns(), None)
+    transaction.on_commit(lambda: cache.set(key, time.time_ns(), None))
+
+
+class ViewerState:
+    """Подписки, Избранное и Список покупок текущего пользователя.
+
+    Каждое множество id загружается одним запросом при первом обращении
+    и живет до конца запроса. Между запросами множества хранятся в кэше
+    с версией пользователя, которую сбрасывают сигналы Follow, Favorite
+    и ShoppingCart.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.version = None
+        self.sets = {}
+
+    def get_version(self):
+        if self.version is None:
+            key = get_version_key(self.user.pk)
+            self.version = cache.get(key)
+            if self.version is None:
+                cache.add(key, time.time_ns(), None)
+                self.version = cache.get(key)
+        return self.version
+
+    def get_ids(self, name):
+        if self.user.is_anonymous:
+            return frozenset()
+        if name not in self.sets:
+            key = f'viewer:{self.user.pk}:{self.get_version()}:{name}'
+            ids = cache.get(key)
+            if ids is None:
+                model, field = VIEWER_SETS[name]
+                ids = frozenset(model.objects.filter(
+                    user=self.user).values_list(field, flat=True))
+                cache.set(key, ids, settings.VIEWER_STATE_CACHE_TIMEOUT)
+            self.sets[name] = ids
+        return self.sets[name]
+
+    def is_following(self, author_id):
+        return author_id in self.get_ids('following')
+
+    def is_favorited(self, recipe_id):
+        return recipe_id in self.get_ids('favorites')
+
+    def is_in_shopping_cart(self, recipe_id):
+        return recipe_id in self.get_ids('shopping_cart')
+
+
+def get_viewer_state(request):
+    """Состояние текущего пользователя, одно на запрос.
+
+    Без запроса пользователь считается анонимным.
+    """
+    if request is None:
+        return ViewerState(AnonymousUser())
+    http_request = getattr(request, '_request', request)
+    state = getattr(http_request, 'viewer_state', None)
+    if state is None:
+        state = http_request.viewer_state = ViewerState(request.user)
+    return state
@@ -1,8 +1,7 @@
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
-from django.template.loader import render_to_string
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.serializers import TokenSerializer
 from djoser.utils import login_user
@@ -12,26 +11,44 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 
 from recipes.models import (Favorite, Follow, Ingredient, Recipe,
-                            RecipeIngredient, Tag)
+                            RecipeSimilarity, ShoppingCart,
+                            ShoppingCartIngredient, Tag)
+from .cache import ingredient_cache, recipe_response_cache, tag_cache
 from .filters import IngredientFilter, RecipeFilter
-from .mixins import CreateListRetrieveViewSet
-from .pagination import CustomPagination
+from .mixins import (AnonymousResponseCacheMixin, CachedCatalogMixin,
+                     ConditionalRetrieveMixin, CreateListRetrieveViewSet)
+from .pagination import (CustomPagination, FeedPagination,
+                         PageLimitPagination)
+from .pantry import pantry_index
 from .permissions import AuthorOrReadOnlyPermission
+from .renderers import SHOPPING_CART_RENDERERS
+from .row_serializers import RECIPE_FIELDS, RecipeRowSerializer
 from .serializers import (FollowSerializer, IngredientSerializer,
+                          PantryQuerySerializer, PantryRecipeSerializer,
                           RecipeCreateUpdateSerializer, RecipeLightSerializer,
                           RecipeSerializer, SetPasswordSerializer,
-                          ShoppingCart, TagSerializer, UserSerializer)
+                          TagSerializer, UserSerializer)
+from .viewer import get_viewer_state
 
 User = get_user_model()
 
 
-class UserViewSet(CreateListRetrieveViewSet):
+class UserViewSet(ConditionalRetrieveMixin, CreateListRetrieveViewSet):
     """Вьюсет для работы с User"""
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = (permissions.AllowAny,)
     pagination_class = CustomPagination
 
+    def get_queryset(self):
+        return User.objects.order_by('id')
+
+    def get_validators(self, user):
+        viewer = get_viewer_state(self.request)
+        return repr(('user', user.pk, user.email, user.username,
+                     user.first_name, user.last_name,
+                     viewer.is_following(user.pk))), None
+
     @action(detail=False, methods=['get'],
             permission_classes=[permissions.IsAuthenticated])
     def me(self, request):
@@ -52,12 +69,20 @@ class UserViewSet(CreateListRetrieveViewSet):
     @action(detail=False, methods=['get'],
             permission_classes=[permissions.IsAuthenticated])
     def subscriptions(self, request):
-        follows = self.request.user.follower.all()
-        serializer = FollowSerializer(follows,
+        recipes_limit = FollowSerializer.get_recipes_limit(request)
+        follows = (
+            request.user.follower.
+            select_related('following').
+            prefetch_related(Prefetch(
+                'following__recipes',
+                queryset=Recipe.objects.latest_for_each_author(recipes_limit),
+                to_attr='latest_recipes')).
+            order_by('id'))
+        page = self.paginate_queryset(follows)
+        serializer = FollowSerializer(page,
                                       many=True,
                                       context={'request': request})
-        response_qs = self.paginate_queryset(serializer.data)
-        return self.get_paginated_response(response_qs)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=[permissions.IsAuthenticated],)
@@ -65,6 +90,7 @@ class UserViewSet(CreateListRetrieveViewSet):
         current_user = self.request.user
         following = get_object_or_404(User, pk=pk)
         if request.method == 'POST':
+            FollowSerializer.get_recipes_limit(request)
             if current_user == following:
                 return Response(
                     {'errors': 'Нельзя подписаться на самого себя'},
@@ -105,8 +131,9 @@ class CustomTokenCreateView(TokenCreateView):
         )
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CachedCatalogMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для отображения Ингредиентов"""
+    catalog_cache = ingredient_cache
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (permissions.AllowAny,)
@@ -115,22 +142,61 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filterset_class = IngredientFilter
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(CachedCatalogMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для отображения Тэгов"""
+    catalog_cache = tag_cache
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (permissions.AllowAny,)
     pagination_class = None
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousResponseCacheMixin, ConditionalRetrieveMixin,
+                    viewsets.ModelViewSet):
     """Вьюсет для работы с Рецептами"""
+    response_cache = recipe_response_cache
+    cached_query_params = ('page', 'limit', 'tags', 'author')
     queryset = Recipe.objects.all()
     permission_classes = (AuthorOrReadOnlyPermission,)
     pagination_class = CustomPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        if self.action in ('list', 'feed'):
+            return Recipe.objects.values(*RECIPE_FIELDS)
+        if self.action == 'retrieve':
+            return Recipe.objects.select_related('author')
+        return Recipe.objects.with_relations()
+
+    def get_serializer(self, *args, **kwargs):
+        if (self.request.method == 'GET'
+                and self.action in ('list', 'retrieve', 'feed')):
+            return RecipeRowSerializer(
+                *args, context=self.get_serializer_context(), **kwargs)
+        return super().get_serializer(*args, **kwargs)
+
+    def get_validators(self, recipe):
+        """ETag по updated_at, профилю автора, версиям справочников
+        и пользователя.
+
+        Last-Modified не отдается: смена профиля автора не оставляет
+        даты, и по одному If-Modified-Since клиент получил бы 304
+        с устаревшим автором.
+        """
+        viewer = get_viewer_state(self.request)
+        versions = [tag_cache.get_version(), ingredient_cache.get_version()]
+        if self.request.user.is_authenticated:
+            versions.append(viewer.get_version())
+        author = recipe.author
+        source = repr((
+            'recipe', recipe.pk, recipe.updated_at.isoformat(), *versions,
+            author.pk, author.email, author.username, author.first_name,
+            author.last_name, viewer.is_following(author.pk),
+            viewer.is_favorited(recipe.pk),
+            viewer.is_in_shopping_cart(recipe.pk)))
+        return source, None
+
     def get_serializer_class(self):
         if self.request.method in ('POST', 'PATCH'):
             return RecipeCreateUpdateSerializer
@@ -153,14 +219,69 @@ class RecipeViewSet(viewsets.ModelViewSet):
             serializer = RecipeLightSerializer(obj.recipe)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         if request.method == 'DELETE':
-            delete_status, _ = model.objects.filter(user=current_user,
-                                                    recipe=recipe).delete()
+            delete_status, _ = model.objects.filter(
+                user=current_user, recipe=recipe).delete()
             if not delete_status:
                 return Response(
                     {'errors': f'Рецепта не было в {errors_answers[1]}'},
                     status=status.HTTP_400_BAD_REQUEST)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=False, methods=['get'],
+            permission_classes=[permissions.IsAuthenticated])
+    def feed(self, request):
+        paginator = FeedPagination()
+        page = paginator.paginate_queryset(self.get_queryset(), request,
+                                           view=self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'],
+            permission_classes=[permissions.AllowAny])
+    def pantry(self, request):
+        """Рецепты по доле ингредиентов из ?ingredients=, которые есть.
+
+        ?max_missing=K оставляет рецепты, где не хватает не больше K
+        ингредиентов.
+        """
+        query = PantryQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        recipe_ids, matched, sizes = pantry_index.search(
+            query.validated_data['ingredients'],
+            query.validated_data.get('max_missing'))
+        paginator = PageLimitPagination()
+        positions = paginator.paginate_queryset(range(len(recipe_ids)),
+                                                request, view=self)
+        recipes = self.get_queryset().in_bulk(
+            recipe_ids[positions].tolist())
+        page = []
+        for position in positions:
+            recipe = recipes.get(int(recipe_ids[position]))
+            if recipe is None:
+                continue
+            recipe.coverage = round(
+                int(matched[position]) / int(sizes[position]), 4)
+            recipe.missing = int(sizes[position] - matched[position])
+            page.append(recipe)
+        serializer = PantryRecipeSerializer(page,
+                                            many=True,
+                                            context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'],
+            permission_classes=[permissions.AllowAny])
+    def similar(self, request, pk):
+        recipe = get_object_or_404(Recipe, pk=pk)
+        similarities = (RecipeSimilarity.objects.
+                        filter(recipe=recipe).
+                        select_related('similar').
+                        order_by('-score', 'similar_id'))
+        serializer = RecipeLightSerializer(
+            [similarity.similar for similarity in similarities],
+            many=True,
+            context={'request': request})
+        return Response(serializer.data)
+
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=[permissions.IsAuthenticated],)
     def favorite(self, request, pk):
@@ -172,28 +293,21 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return self.favorite_shopping_cart(request, pk, ShoppingCart)
 
     @action(detail=False, methods=['get'],
-            permission_classes=[permissions.IsAuthenticated],)
+            permission_classes=[permissions.IsAuthenticated],
+            renderer_classes=SHOPPING_CART_RENDERERS)
     def download_shopping_cart(self, request):
-        shopping_cart_qs = (
-            RecipeIngredient.objects.
-            filter(recipe__in_shoppingcart_for_users__user=request.user).
-            values('ingredient__name', 'ingredient__measurement_unit').
-            annotate(total_count=Sum('amount')))
-        if shopping_cart_qs.count() == 0:
-            return HttpResponse('Список покупок ПУСТ',
-                                'Content-Type: text/plain')
-        shopping_cart = []
-        for ingredient in shopping_cart_qs:
-            shopping_cart.append([
-                ingredient.get('ingredient__name'),
-                ingredient.get('ingredient__measurement_unit'),
-                ingredient.get('total_count')
-            ])
-        shopping_cart_txt = render_to_string(
-            'shopping_cart.txt',
-            context={'shopping_cart': shopping_cart}
-        )
-        response = HttpResponse(shopping_cart_txt, 'Content-Type: text/plain')
-        response['Content-Disposition'] = ('attachment; '
-                                           'filename=shopping_cart.pdf')
+        """Список покупок в формате txt, csv или pdf (параметр format)"""
+        shopping_cart_rows = (
+            ShoppingCartIngredient.objects.
+            filter(user=request.user).
+            values_list('ingredient__name',
+                        'ingredient__measurement_unit',
+                        'total_amount').
+            order_by('ingredient__name', 'ingredient__measurement_unit').
+            iterator())
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(renderer.stream(shopping_cart_rows),
+                                         content_type=renderer.content_type)
+        response['Content-Disposition'] = (
+            f'attachment; filename=shopping_cart.{renderer.format}')
         return response
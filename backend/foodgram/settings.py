@@ -69,6 +69,18 @@ DATABASES = {
     }
 }
 
+# LocMemCache у каждого процесса свой, сбросы версий из manage.py
+# и других воркеров в нем не видны - он годится только для разработки.
+# В docker-compose используется общий memcached.
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
+    }
+}
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -121,6 +133,47 @@ REST_FRAMEWORK = {
 
 RECIPES_LIMIT = 3
 
+PAGINATION_COUNT_CACHE_TIMEOUT = 60
+
+CATALOG_CACHE_TIMEOUT = 60 * 60 * 24
+CATALOG_LOCAL_CACHE_SIZE = 256
+
+INGREDIENT_SEARCH_LIMIT = 50
+
+VIEWER_STATE_CACHE_TIMEOUT = 60 * 60
+
+RESPONSE_CACHE_TIMEOUT = 60 * 10
+RESPONSE_CACHE_STALE_TIMEOUT = 30
+RESPONSE_CACHE_MAX_AGE = 10
+
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+
+BACKGROUND_WORKERS = int(os.getenv('BACKGROUND_WORKERS', default=2))
+
+IMAGE_UPLOAD_SPOOL_SIZE = 1024 * 1024
+IMAGE_UPLOAD_MAX_SIDE = 8000
+IMAGE_UPLOAD_MAX_PIXELS = 40_000_000
+IMAGE_VARIANTS = {
+    'thumbnail': (160, 160),
+    'card': (480, 480),
+    'full': (1600, 1600),
+}
+IMAGE_VARIANT_QUALITY = 80
+
+TRENDING_HALF_LIFE_DAYS = 3
+TRENDING_WINDOW_DAYS = 30
+TRENDING_FAVORITE_WEIGHT = 1
+TRENDING_SHOPPING_CART_WEIGHT = 2
+
+FEED_FANOUT_LIMIT = 1000
+FEED_BACKFILL_LIMIT = 100
+
+SIMILAR_RECIPES_TOP_K = 10
+
+SIMILAR_RECIPES_MAX_DF = 0.05
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
 }
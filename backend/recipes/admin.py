@@ -1,7 +1,10 @@
 from django.contrib import admin
 
 from .models import (Favorite, Follow, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart, Tag)
+                     ShoppingCart, ShoppingCartIngredient, Tag)
+from .search import refresh_search_documents
+from .similarity import schedule_similarity_refresh
+from .services import get_recipe_amounts, update_recipe_in_shopping_carts
 
 
 @admin.register(Ingredient)
@@ -29,9 +32,20 @@ class RecipeAdmin(admin.ModelAdmin):
     search_fields = ('name', 'author__email')
     inlines = [IngredientInline]
 
-    @admin.display(description='Количество добавлений в Избранное')
+    @admin.display(description='Количество добавлений в Избранное',
+                   ordering='favorites_count')
     def added_in_favorite(self, obj):
-        return obj.favorite_for_users.count()
+        return obj.favorites_count
+
+    def save_related(self, request, form, formsets, change):
+        recipe = form.instance
+        old_amounts = get_recipe_amounts(recipe) if change else {}
+        super().save_related(request, form, formsets, change)
+        new_amounts = get_recipe_amounts(recipe)
+        update_recipe_in_shopping_carts(recipe, old_amounts, new_amounts)
+        refresh_search_documents([recipe.pk])
+        if old_amounts.keys() != new_amounts.keys():
+            schedule_similarity_refresh([recipe.pk])
 
 
 @admin.register(Tag)
@@ -57,3 +71,8 @@ class FavoriteAdmin(admin.ModelAdmin):
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('pk', 'user', 'recipe')
+
+
+@admin.register(ShoppingCartIngredient)
+class ShoppingCartIngredientAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'ingredient', 'total_amount')
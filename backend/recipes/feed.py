@@ -0,0 +1,160 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from .models import FeedEntry, Follow, Recipe
+
+BATCH_SIZE = 1000
+
+
+def is_pull_author(author):
+    """Рецепты авторов с очень большим числом подписчиков не рассылаются"""
+    return author.followers_count > settings.FEED_FANOUT_LIMIT
+
+
+def fan_out_recipe(recipe):
+    """Добавляет новый рецепт в ленты подписчиков автора"""
+    if is_pull_author(recipe.author):
+        return
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe.pk,
+                   author_id=recipe.author_id, pub_date=recipe.pub_date)
+         for user_id in Follow.objects.filter(
+             following_id=recipe.author_id).values_list('user_id', flat=True)),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True)
+
+
+def fan_out_recipes(recipe_ids):
+    """Добавляет пачку новых рецептов в ленты подписчиков их авторов"""
+    recipes = {}
+    for recipe_id, author_id, pub_date in Recipe.objects.filter(
+            pk__in=recipe_ids,
+            author__followers_count__lte=settings.FEED_FANOUT_LIMIT,
+    ).values_list('pk', 'author_id', 'pub_date'):
+        recipes.setdefault(author_id, []).append((recipe_id, pub_date))
+    if not recipes:
+        return
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe_id, author_id=author_id,
+                   pub_date=pub_date)
+         for user_id, author_id in Follow.objects.filter(
+             following_id__in=recipes).values_list(
+                 'user_id', 'following_id').iterator()
+         for recipe_id, pub_date in recipes[author_id]),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True)
+
+
+def get_latest_recipes(author_id):
+    """Последние рецепты автора для ленты: [(id, pub_date)]"""
+    return list(Recipe.objects.filter(author_id=author_id).order_by(
+        '-pub_date', '-id').values_list(
+            'pk', 'pub_date')[:settings.FEED_BACKFILL_LIMIT])
+
+
+def add_author_to_feed(user_id, author):
+    """Добавляет в ленту последние рецепты автора после подписки"""
+    if is_pull_author(author):
+        return
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe_id, author_id=author.pk,
+                   pub_date=pub_date)
+         for recipe_id, pub_date in get_latest_recipes(author.pk)),
+        ignore_conflicts=True)
+
+
+def add_author_to_all_feeds(author_id):
+    """Рассылает последние рецепты автора всем его подписчикам.
+
+    Нужна, когда у автора становится не больше FEED_FANOUT_LIMIT
+    подписчиков: рецепты, которые лента до этого дочитывала напрямую,
+    иначе пропали бы из лент.
+    """
+    recipes = get_latest_recipes(author_id)
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe_id, author_id=author_id,
+                   pub_date=pub_date)
+         for user_id in Follow.objects.filter(
+             following_id=author_id).values_list(
+                 'user_id', flat=True).iterator()
+         for recipe_id, pub_date in recipes),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True)
+
+
+def remove_author_from_feed(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def get_pull_authors(user):
+    return Follow.objects.filter(
+        user=user,
+        following__followers_count__gt=settings.FEED_FANOUT_LIMIT,
+    ).values('following')
+
+
+def get_feed(queryset, user):
+    """Рецепты ленты подписок пользователя одним условием.
+
+    Годится для подсчета, но не для страниц: условие с OR не читается
+    по индексу ленты, для страниц есть get_feed_page().
+    """
+    return queryset.filter(
+        Q(pk__in=FeedEntry.objects.filter(user=user).values('recipe'))
+        | Q(author__in=get_pull_authors(user))
+    ).order_by('-pub_date', '-id')
+
+
+def get_feed_page(user, limit, after=None):
+    """До limit рецептов ленты подписок, новые первыми: [(pub_date, id)].
+
+    Рецепты обычных авторов читаются из FeedEntry по индексу
+    (user, -pub_date, -recipe), рецепты авторов с числом подписчиков
+    больше FEED_FANOUT_LIMIT - по индексу (author, -pub_date, -id).
+    Обе выборки ограничены limit и сливаются. after - (pub_date, id)
+    последнего рецепта предыдущей страницы.
+    """
+    entries = FeedEntry.objects.filter(user=user)
+    pulled = Recipe.objects.filter(author__in=get_pull_authors(user))
+    if after is not None:
+        pub_date, recipe_id = after
+        entries = entries.filter(
+            Q(pub_date__lt=pub_date)
+            | Q(pub_date=pub_date, recipe_id__lt=recipe_id))
+        pulled = pulled.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=recipe_id))
+    # Автор мог перейти порог после рассылки: его рецепт может прийти
+    # из обеих выборок.
+    keys = set(entries.order_by('-pub_date', '-recipe_id').values_list(
+        'pub_date', 'recipe_id')[:limit])
+    keys.update(pulled.order_by('-pub_date', '-id').values_list(
+        'pub_date', 'pk')[:limit])
+    return sorted(keys, reverse=True)[:limit]
+
+
+@transaction.atomic
+def rebuild_feed():
+    """Пересобирает ленты всех пользователей по подпискам"""
+    FeedEntry.objects.all().delete()
+    recipes = {}
+    for author_id, recipe_id, pub_date in (
+            Recipe.objects.latest_for_each_author(
+                settings.FEED_BACKFILL_LIMIT).
+            order_by().values_list('author_id', 'pk', 'pub_date').iterator()):
+        recipes.setdefault(author_id, []).append((recipe_id, pub_date))
+    follows = Follow.objects.filter(
+        following__followers_count__lte=settings.FEED_FANOUT_LIMIT
+    ).values_list('user_id', 'following_id')
+    batch = []
+    count = 0
+    for user_id, author_id in follows.iterator():
+        batch += [FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                            author_id=author_id, pub_date=pub_date)
+                  for recipe_id, pub_date in recipes.get(author_id, ())]
+        if len(batch) >= BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch)
+            count += len(batch)
+            batch = []
+    FeedEntry.objects.bulk_create(batch)
+    return count + len(batch)
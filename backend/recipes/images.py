@@ -0,0 +1,54 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.dispatch import Signal
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import Recipe
+from .workers import submit_on_commit
+
+VARIANT_FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+# Отправляется после записи Recipe.image_variants через update().
+variants_generated = Signal()
+
+
+def get_variant_name(variant, extension):
+    """Имя для сохранения копии: хранилище само заменит его на хэш"""
+    upload_to = Recipe._meta.get_field('image').upload_to
+    return os.path.join(upload_to, f'{variant}.{extension}')
+
+
+def generate_variants(recipe_id, name):
+    """Сохраняет уменьшенные копии картинки рецепта во всех форматах.
+
+    Записывает пути в Recipe.image_variants, только если картинка
+    рецепта за это время не сменилась.
+    """
+    storage = Recipe._meta.get_field('image').storage
+    variants = {}
+    with storage.open(name) as file, Image.open(file) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        for variant, size in settings.IMAGE_VARIANTS.items():
+            resized = image.copy()
+            resized.thumbnail(size, Image.LANCZOS)
+            variants[variant] = {}
+            for extension, image_format in VARIANT_FORMATS.items():
+                buffer = BytesIO()
+                resized.save(buffer, image_format,
+                             quality=settings.IMAGE_VARIANT_QUALITY)
+                variants[variant][extension] = storage.save(
+                    get_variant_name(variant, extension),
+                    ContentFile(buffer.getvalue()))
+    if Recipe.objects.filter(pk=recipe_id, image=name).update(
+            image_variants=variants, updated_at=timezone.now()):
+        variants_generated.send(sender=Recipe, recipe_id=recipe_id)
+    return variants
+
+
+def schedule_variants(recipe):
+    """Ставит обработку картинки рецепта в пул после коммита"""
+    submit_on_commit(generate_variants, recipe.pk, recipe.image.name)
@@ -0,0 +1,54 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Sum
+
+
+def fill_shopping_cart_ingredients(apps, schema_editor):
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingCartIngredient = apps.get_model('recipes',
+                                            'ShoppingCartIngredient')
+    totals = (RecipeIngredient.objects.
+              filter(recipe__in_shoppingcart_for_users__isnull=False).
+              values_list('recipe__in_shoppingcart_for_users__user',
+                          'ingredient').
+              annotate(total_amount=Sum('amount')).
+              order_by())
+    ShoppingCartIngredient.objects.bulk_create(
+        (ShoppingCartIngredient(user_id=user_id,
+                                ingredient_id=ingredient_id,
+                                total_amount=total_amount)
+         for user_id, ingredient_id, total_amount in totals.iterator()),
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartIngredient',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.PositiveIntegerField(default=0, verbose_name='Общее количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='in_shopping_carts', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_ingredients', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент в Списке покупок',
+                'verbose_name_plural': 'Ингредиенты в Списках покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppingcartingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shoppingcart_user_ingredient'),
+        ),
+        migrations.RunPython(fill_shopping_cart_ingredients,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+DOCUMENT_TABLE = 'recipes_recipesearchdocument'
+FTS_TABLE = f'{DOCUMENT_TABLE}_fts'
+
+SETUP_SQL = {
+    'postgresql': (
+        f"ALTER TABLE {DOCUMENT_TABLE} ADD COLUMN search_vector tsvector "
+        f"GENERATED ALWAYS AS ("
+        f"setweight(to_tsvector('russian', title), 'A') || "
+        f"setweight(to_tsvector('russian', body), 'B')) STORED",
+        f"CREATE INDEX {DOCUMENT_TABLE}_search_vector_gin "
+        f"ON {DOCUMENT_TABLE} USING gin (search_vector)",
+    ),
+    'sqlite': (
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+        f"title, body, content='{DOCUMENT_TABLE}', "
+        f"content_rowid='recipe_id', tokenize='unicode61')",
+        f"CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON {DOCUMENT_TABLE} "
+        f"BEGIN INSERT INTO {FTS_TABLE}(rowid, title, body) "
+        f"VALUES (new.recipe_id, new.title, new.body); END",
+        f"CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON {DOCUMENT_TABLE} "
+        f"BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body) "
+        f"VALUES ('delete', old.recipe_id, old.title, old.body); END",
+        f"CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE ON {DOCUMENT_TABLE} "
+        f"BEGIN INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, body) "
+        f"VALUES ('delete', old.recipe_id, old.title, old.body); "
+        f"INSERT INTO {FTS_TABLE}(rowid, title, body) "
+        f"VALUES (new.recipe_id, new.title, new.body); END",
+    ),
+}
+
+TEARDOWN_SQL = {
+    'postgresql': (
+        f"ALTER TABLE {DOCUMENT_TABLE} DROP COLUMN search_vector",
+    ),
+    'sqlite': (
+        f"DROP TRIGGER {FTS_TABLE}_insert",
+        f"DROP TRIGGER {FTS_TABLE}_delete",
+        f"DROP TRIGGER {FTS_TABLE}_update",
+        f"DROP TABLE {FTS_TABLE}",
+    ),
+}
+
+
+def setup_search_index(apps, schema_editor):
+    for statement in SETUP_SQL.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(statement)
+
+
+def teardown_search_index(apps, schema_editor):
+    for statement in TEARDOWN_SQL.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(statement)
+
+
+def fill_search_documents(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeSearchDocument = apps.get_model('recipes', 'RecipeSearchDocument')
+    for recipe in Recipe.objects.prefetch_related('ingredients'):
+        body = ' '.join([recipe.text, *(ingredient.name for ingredient
+                                         in recipe.ingredients.all())])
+        RecipeSearchDocument.objects.create(
+            recipe=recipe,
+            title=recipe.name.lower().replace('ё', 'е'),
+            body=body.lower().replace('ё', 'е'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_shoppingcartingredient'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeSearchDocument',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('title', models.TextField(verbose_name='Название рецепта')),
+                ('body', models.TextField(verbose_name='Описание и ингредиенты')),
+            ],
+            options={
+                'verbose_name': 'Поисковый документ рецепта',
+                'verbose_name_plural': 'Поисковые документы рецептов',
+            },
+        ),
+        migrations.RunPython(setup_search_index, teardown_search_index),
+        migrations.RunPython(fill_search_documents,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_recipesearchdocument'),
+    ]
+
+    operations = [
+        # Автоматическая M2M-таблица тэгов индексирована по (recipe, tag);
+        # фильтру рецептов по тэгам нужен обратный порядок колонок.
+        migrations.RunSQL(
+            'CREATE INDEX recipes_recipe_tags_tag_recipe_idx '
+            'ON recipes_recipe_tags (tag_id, recipe_id)',
+            reverse_sql='DROP INDEX recipes_recipe_tags_tag_recipe_idx',
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:27
+
+from django.db import migrations, models
+import recipes.storage
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(storage=recipes.storage.ContentAddressedStorage(), upload_to='recipes/images/', verbose_name='Картинка блюда'),
+        ),
+    ]
@@ -0,0 +1,77 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:31
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+MAX_RECIPE_AMOUNT = 32767
+
+
+def merge_rows(model, owner_field, amount_field, replacements, limit=None):
+    """Переносит строки на оставляемые ингредиенты, складывая количества"""
+    kept = {}
+    to_update = {}
+    to_delete = []
+    rows = model.objects.filter(
+        ingredient_id__in=set(replacements) | set(replacements.values())
+    ).order_by('pk')
+    for row in rows:
+        target = replacements.get(row.ingredient_id, row.ingredient_id)
+        key = (getattr(row, owner_field), target)
+        if key in kept:
+            main = kept[key]
+            amount = getattr(main, amount_field) + getattr(row, amount_field)
+            setattr(main, amount_field,
+                    amount if limit is None else min(amount, limit))
+            to_update[main.pk] = main
+            to_delete.append(row.pk)
+            continue
+        kept[key] = row
+        if row.ingredient_id != target:
+            row.ingredient_id = target
+            to_update[row.pk] = row
+    model.objects.filter(pk__in=to_delete).delete()
+    model.objects.bulk_update(list(to_update.values()),
+                              ['ingredient', amount_field], batch_size=1000)
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Объединяет ингредиенты с одинаковыми названием и единицей"""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingCartIngredient = apps.get_model('recipes',
+                                            'ShoppingCartIngredient')
+    groups = (Ingredient.objects.values('name', 'measurement_unit').
+              annotate(keep_id=Min('pk'), count=Count('pk')).
+              filter(count__gt=1).order_by())
+    keep_ids = {(group['name'], group['measurement_unit']): group['keep_id']
+                for group in groups}
+    if not keep_ids:
+        return
+    replacements = {
+        pk: keep_ids[(name, measurement_unit)]
+        for pk, name, measurement_unit in Ingredient.objects.filter(
+            name__in={name for name, _ in keep_ids}).values_list(
+                'pk', 'name', 'measurement_unit')
+        if keep_ids.get((name, measurement_unit), pk) != pk
+    }
+    merge_rows(RecipeIngredient, 'recipe_id', 'amount', replacements,
+               MAX_RECIPE_AMOUNT)
+    merge_rows(ShoppingCartIngredient, 'user_id', 'total_amount',
+               replacements)
+    Ingredient.objects.filter(pk__in=replacements).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_name_measurement_unit'),
+        ),
+    ]
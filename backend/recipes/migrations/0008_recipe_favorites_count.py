@@ -0,0 +1,42 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:32
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_related(related_model, field):
+    return Coalesce(Subquery(
+        related_model.objects.filter(**{field: OuterRef('pk')}).
+        order_by().
+        values(field).
+        annotate(total=Count('pk')).
+        values('total')), 0)
+
+
+def fill_counters(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Favorite = apps.get_model('recipes', 'Favorite')
+    Follow = apps.get_model('recipes', 'Follow')
+    Recipe.objects.update(favorites_count=count_related(Favorite, 'recipe'))
+    User.objects.update(recipes_count=count_related(Recipe, 'author'),
+                        followers_count=count_related(Follow, 'following'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_ingredient_unique_name_measurement_unit'),
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Количество добавлений в Избранное'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_recipe_favorites_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeScore',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('favorites', models.PositiveIntegerField(default=0, verbose_name='Добавлений в Избранное')),
+                ('shopping_carts', models.PositiveIntegerField(default=0, verbose_name='Добавлений в Список покупок')),
+                ('trending', models.FloatField(default=0, verbose_name='Популярность с затуханием по времени')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Дата пересчета')),
+            ],
+            options={
+                'verbose_name': 'Оценка рецепта',
+                'verbose_name_plural': 'Оценки рецептов',
+            },
+        ),
+        migrations.AddField(
+            model_name='favorite',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now, verbose_name='Дата добавления в Избранное'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, default=django.utils.timezone.now, verbose_name='Дата добавления в Список покупок'),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='recipescore',
+            index=models.Index(fields=['-favorites', 'recipe'], name='recipescore_favorites_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipescore',
+            index=models.Index(fields=['-shopping_carts', 'recipe'], name='recipescore_carts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipescore',
+            index=models.Index(fields=['-trending', 'recipe'], name='recipescore_trending_idx'),
+        ),
+    ]
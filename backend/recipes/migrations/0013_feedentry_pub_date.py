@@ -0,0 +1,40 @@
+# Generated by Django 3.2.3 on 2026-10-18 04:10
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_pub_date(apps, schema_editor):
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    FeedEntry.objects.update(pub_date=Subquery(
+        Recipe.objects.filter(pk=OuterRef('recipe')).values('pub_date')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedentry',
+            name='pub_date',
+            field=models.DateTimeField(null=True, verbose_name='Дата публикации рецепта'),
+        ),
+        migrations.RunPython(fill_pub_date, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='feedentry',
+            name='pub_date',
+            field=models.DateTimeField(verbose_name='Дата публикации рецепта'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-pub_date', '-recipe'], name='feedentry_user_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 3.2.3 on 2026-10-18 04:40
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 1000
+
+
+def fill_scores(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeScore = apps.get_model('recipes', 'RecipeScore')
+    RecipeScore.objects.update(pub_date=Subquery(
+        Recipe.objects.filter(pk=OuterRef('recipe')).values('pub_date')))
+    RecipeScore.objects.bulk_create(
+        (RecipeScore(recipe_id=recipe_id, pub_date=pub_date)
+         for recipe_id, pub_date in Recipe.objects.filter(
+             score__isnull=True).values_list('pk', 'pub_date').iterator()),
+        batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_feedentry_pub_date'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='recipescore',
+            name='recipescore_favorites_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipescore',
+            name='recipescore_carts_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipescore',
+            name='recipescore_trending_idx',
+        ),
+        migrations.AddField(
+            model_name='recipescore',
+            name='pub_date',
+            field=models.DateTimeField(null=True, verbose_name='Дата публикации рецепта'),
+        ),
+        migrations.RunPython(fill_scores, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='recipescore',
+            name='pub_date',
+            field=models.DateTimeField(verbose_name='Дата публикации рецепта'),
+        ),
+        migrations.AddIndex(
+            model_name='recipescore',
+            index=models.Index(fields=['-favorites', '-pub_date', '-recipe'], name='recipescore_favorites_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipescore',
+            index=models.Index(fields=['-shopping_carts', '-pub_date', '-recipe'], name='recipescore_carts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipescore',
+            index=models.Index(fields=['-trending', '-pub_date', '-recipe'], name='recipescore_trending_idx'),
+        ),
+    ]
@@ -2,6 +2,9 @@ from colorfield.fields import ColorField
 from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator
 from django.db import models
+from django.db.models import OuterRef, Prefetch, Subquery
+
+from .storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -40,11 +43,45 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_name_measurement_unit'
+            )
+        ]
 
     def __str__(self):
         return self.name + ', ' + self.measurement_unit
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Выборки рецептов для API"""
+
+    @staticmethod
+    def get_content_lookups():
+        """Связи, которые выводятся вместе с рецептом"""
+        return (
+            Prefetch('tags', queryset=Tag.objects.order_by('id')),
+            Prefetch('ingredients_in_recipe',
+                     queryset=RecipeIngredient.objects.select_related(
+                         'ingredient').order_by('id')),
+        )
+
+    def with_relations(self):
+        """Подгружает связи рецептов для API.
+
+        Страница рецептов обходится фиксированным числом запросов
+        независимо от ее размера.
+        """
+        return self.prefetch_related(*self.get_content_lookups(), 'author')
+
+    def latest_for_each_author(self, limit):
+        """Оставляет не больше limit последних рецептов каждого автора."""
+        latest = Recipe.objects.filter(
+            author=OuterRef('author')).values('pk')[:limit]
+        return self.filter(pk__in=Subquery(latest))
+
+
 class Recipe(models.Model):
     """Модель Рецепта"""
     name = models.CharField(
@@ -64,6 +101,10 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True,
     )
+    updated_at = models.DateTimeField(
+        verbose_name='Дата изменения',
+        auto_now=True,
+    )
     author = models.ForeignKey(User,
                                related_name='recipes',
                                on_delete=models.CASCADE,
@@ -75,12 +116,32 @@ class Recipe(models.Model):
                                   related_name='recipes',
                                   verbose_name='Тэг',)
     image = models.ImageField(upload_to='recipes/images/',
+                              storage=ContentAddressedStorage(),
                               verbose_name='Картинка блюда')
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество добавлений в Избранное',
+    )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        editable=False,
+        verbose_name='Уменьшенные копии картинки',
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='recipe_author_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -117,6 +178,28 @@ class RecipeIngredient(models.Model):
         return f'{self.recipe} - {self.ingredient} {self.amount}'
 
 
+class RecipeSearchDocument(models.Model):
+    """Поисковый документ рецепта.
+
+    По нему строится полнотекстовый индекс: в PostgreSQL - колонка
+    tsvector с GIN-индексом, в SQLite - таблица FTS5 (см. recipes.search).
+    """
+    recipe = models.OneToOneField(Recipe,
+                                  primary_key=True,
+                                  related_name='search_document',
+                                  on_delete=models.CASCADE,
+                                  verbose_name='Рецепт')
+    title = models.TextField(verbose_name='Название рецепта')
+    body = models.TextField(verbose_name='Описание и ингредиенты')
+
+    class Meta:
+        verbose_name = 'Поисковый документ рецепта'
+        verbose_name_plural = 'Поисковые документы рецептов'
+
+    def __str__(self):
+        return self.title
+
+
 class Favorite(models.Model):
     """Модель (М2М) Избранных рецептов у пользователей"""
     user = models.ForeignKey(User,
@@ -127,6 +210,11 @@ class Favorite(models.Model):
                                related_name='favorite_for_users',
                                on_delete=models.CASCADE,
                                verbose_name='Рецепт')
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления в Избранное',
+    )
 
     class Meta:
         verbose_name = 'Избранное'
@@ -152,6 +240,11 @@ class ShoppingCart(models.Model):
                                related_name='in_shoppingcart_for_users',
                                on_delete=models.CASCADE,
                                verbose_name='Рецепт')
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления в Список покупок',
+    )
 
     class Meta:
         verbose_name = 'Список покупок'
@@ -167,6 +260,85 @@ class ShoppingCart(models.Model):
         return f'{self.user} - {self.recipe}'
 
 
+class RecipeScore(models.Model):
+    """Оценки популярности рецепта.
+
+    Пересчитываются периодически командой refresh_recipe_scores
+    по таблицам Favorite и ShoppingCart (см. recipes.scores). Строка
+    с нулями заводится вместе с рецептом, а дата публикации скопирована
+    из него, поэтому сортировка по оценке - внутреннее соединение,
+    которое читается по индексу (-оценка, -pub_date, -recipe).
+    """
+    recipe = models.OneToOneField(Recipe,
+                                  primary_key=True,
+                                  related_name='score',
+                                  on_delete=models.CASCADE,
+                                  verbose_name='Рецепт')
+    favorites = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Добавлений в Избранное',
+    )
+    shopping_carts = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Добавлений в Список покупок',
+    )
+    trending = models.FloatField(
+        default=0,
+        verbose_name='Популярность с затуханием по времени',
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации рецепта')
+    updated = models.DateTimeField(auto_now=True,
+                                   verbose_name='Дата пересчета')
+
+    class Meta:
+        verbose_name = 'Оценка рецепта'
+        verbose_name_plural = 'Оценки рецептов'
+        indexes = [
+            models.Index(fields=['-favorites', '-pub_date', '-recipe'],
+                         name='recipescore_favorites_idx'),
+            models.Index(fields=['-shopping_carts', '-pub_date', '-recipe'],
+                         name='recipescore_carts_idx'),
+            models.Index(fields=['-trending', '-pub_date', '-recipe'],
+                         name='recipescore_trending_idx'),
+        ]
+
+    def __str__(self):
+        return str(self.recipe_id)
+
+
+class ShoppingCartIngredient(models.Model):
+    """Суммарное количество ингредиента в Списке покупок пользователя.
+
+    Денормализованная таблица: обновляется при изменении Списка покупок
+    и ингредиентов рецептов из него (см. recipes.services).
+    """
+    user = models.ForeignKey(User,
+                             related_name='shopping_cart_ingredients',
+                             on_delete=models.CASCADE,
+                             verbose_name='Пользователь')
+    ingredient = models.ForeignKey(Ingredient,
+                                   related_name='in_shopping_carts',
+                                   on_delete=models.CASCADE,
+                                   verbose_name='Ингредиент')
+    total_amount = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Общее количество',
+    )
+
+    class Meta:
+        verbose_name = 'Ингредиент в Списке покупок'
+        verbose_name_plural = 'Ингредиенты в Списках покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shoppingcart_user_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.ingredient} {self.total_amount}'
+
+
 class Follow(models.Model):
     """Модель (М2М) Подписок у пользователей"""
     user = models.ForeignKey(User,
@@ -193,3 +365,76 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'{self.user} - {self.following}'
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписок пользователя.
+
+    Строки пишутся при публикации рецепта подписчикам автора и при
+    подписке; для авторов с очень большим числом подписчиков лента
+    дочитывает их рецепты напрямую (см. recipes.feed). Дата публикации
+    рецепта скопирована, чтобы страницы ленты читались по индексу
+    (user, -pub_date, -recipe).
+    """
+    user = models.ForeignKey(User,
+                             related_name='feed_entries',
+                             on_delete=models.CASCADE,
+                             verbose_name='Подписчик')
+    recipe = models.ForeignKey(Recipe,
+                               related_name='feed_entries',
+                               on_delete=models.CASCADE,
+                               verbose_name='Рецепт')
+    author = models.ForeignKey(User,
+                               related_name='+',
+                               on_delete=models.CASCADE,
+                               verbose_name='Автор рецепта')
+    pub_date = models.DateTimeField(verbose_name='Дата публикации рецепта')
+
+    class Meta:
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feedentry_user_recipe'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['user', 'author'],
+                         name='feedentry_user_author_idx'),
+            models.Index(fields=['user', '-pub_date', '-recipe'],
+                         name='feedentry_user_pub_date_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.recipe}'
+
+
+class RecipeSimilarity(models.Model):
+    """Один из top-K похожих по ингредиентам рецептов"""
+    recipe = models.ForeignKey(Recipe,
+                               related_name='similarities',
+                               on_delete=models.CASCADE,
+                               verbose_name='Рецепт')
+    similar = models.ForeignKey(Recipe,
+                                related_name='+',
+                                on_delete=models.CASCADE,
+                                verbose_name='Похожий рецепт')
+    score = models.FloatField(verbose_name='Косинусная близость')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_recipesimilarity_recipe_similar'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['recipe', '-score'],
+                         name='recipesimilarity_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} ~ {self.similar_id}'
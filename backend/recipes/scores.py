@@ -0,0 +1,80 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Favorite, Recipe, RecipeScore, ShoppingCart
+
+
+def get_decay(day, today):
+    """Вес события дня day: половина за каждые TRENDING_HALF_LIFE_DAYS"""
+    age = (today - day).days
+    return 0.5 ** (age / settings.TRENDING_HALF_LIFE_DAYS)
+
+
+def count_by_recipe(model):
+    return dict(model.objects.values('recipe').
+                annotate(total=Count('pk')).
+                order_by().
+                values_list('recipe', 'total'))
+
+
+def get_trending(today):
+    """Популярность по событиям за окно TRENDING_WINDOW_DAYS.
+
+    События считаются по дням одним запросом на таблицу, затухание
+    применяется к дневным корзинам.
+    """
+    since = timezone.make_aware(datetime.combine(
+        today - timedelta(days=settings.TRENDING_WINDOW_DAYS), time.min))
+    trending = {}
+    for model, weight in ((Favorite, settings.TRENDING_FAVORITE_WEIGHT),
+                          (ShoppingCart,
+                           settings.TRENDING_SHOPPING_CART_WEIGHT)):
+        buckets = (model.objects.filter(created__gte=since).
+                   annotate(day=TruncDate('created')).
+                   values('recipe', 'day').
+                   annotate(total=Count('pk')).
+                   order_by().
+                   values_list('recipe', 'day', 'total'))
+        for recipe_id, day, total in buckets.iterator():
+            trending[recipe_id] = (trending.get(recipe_id, 0)
+                                   + weight * total * get_decay(day, today))
+    return trending
+
+
+@transaction.atomic
+def refresh_recipe_scores(batch_size=1000):
+    """Пересобирает таблицу RecipeScore для всех рецептов"""
+    today = timezone.localdate()
+    favorites = count_by_recipe(Favorite)
+    shopping_carts = count_by_recipe(ShoppingCart)
+    trending = get_trending(today)
+    RecipeScore.objects.all().delete()
+    RecipeScore.objects.bulk_create(
+        (RecipeScore(recipe_id=recipe_id,
+                     pub_date=pub_date,
+                     favorites=favorites.get(recipe_id, 0),
+                     shopping_carts=shopping_carts.get(recipe_id, 0),
+                     trending=round(trending.get(recipe_id, 0), 6))
+         for recipe_id, pub_date in Recipe.objects.values_list(
+             'pk', 'pub_date').iterator()),
+        batch_size=batch_size,
+        ignore_conflicts=True)
+    return RecipeScore.objects.count()
+
+
+def create_missing_scores(recipe_ids=None, batch_size=1000):
+    """Заводит нулевые оценки рецептам, у которых их еще нет"""
+    recipes = Recipe.objects.filter(score__isnull=True)
+    if recipe_ids is not None:
+        recipes = recipes.filter(pk__in=recipe_ids)
+    RecipeScore.objects.bulk_create(
+        (RecipeScore(recipe_id=recipe_id, pub_date=pub_date)
+         for recipe_id, pub_date in recipes.values_list(
+             'pk', 'pub_date').iterator()),
+        batch_size=batch_size,
+        ignore_conflicts=True)
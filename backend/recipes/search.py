@@ -0,0 +1,91 @@
+import re
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVectorField)
+from django.db import connection
+from django.db.models import (F, FloatField, Func, OuterRef, Q, Subquery,
+                              Value)
+from django.db.models.expressions import RawSQL
+
+from .models import Recipe, RecipeIngredient, RecipeSearchDocument
+
+DOCUMENT_TABLE = RecipeSearchDocument._meta.db_table
+FTS_TABLE = f'{DOCUMENT_TABLE}_fts'
+
+
+def normalize(text):
+    return text.lower().replace('ё', 'е')
+
+
+def refresh_search_documents(recipe_ids):
+    """Пересобирает поисковые документы рецептов"""
+    recipe_ids = list(recipe_ids)
+    ingredients = {}
+    for recipe_id, name in (RecipeIngredient.objects.
+                            filter(recipe_id__in=recipe_ids).
+                            values_list('recipe_id', 'ingredient__name')):
+        ingredients.setdefault(recipe_id, []).append(name)
+    documents = [
+        RecipeSearchDocument(
+            recipe_id=recipe_id,
+            title=normalize(name),
+            body=normalize(' '.join([text, *ingredients.get(recipe_id, [])])))
+        for recipe_id, name, text in Recipe.objects.filter(
+            pk__in=recipe_ids).values_list('pk', 'name', 'text')
+    ]
+    existing = set(RecipeSearchDocument.objects.filter(
+        recipe_id__in=recipe_ids).values_list('recipe_id', flat=True))
+    RecipeSearchDocument.objects.bulk_update(
+        [document for document in documents
+         if document.recipe_id in existing],
+        ['title', 'body'])
+    RecipeSearchDocument.objects.bulk_create(
+        [document for document in documents
+         if document.recipe_id not in existing])
+
+
+class FTSRank(Func):
+    """Релевантность рецепта по таблице FTS5 SQLite: больше - лучше"""
+    template = (f'(SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %(query)s AND rowid = %(recipe)s)')
+    output_field = FloatField()
+
+    def __init__(self, query, recipe):
+        super().__init__(Value(query), recipe)
+
+    def as_sql(self, compiler, connection):
+        query, recipe = self.get_source_expressions()
+        query_sql, query_params = compiler.compile(query)
+        recipe_sql, recipe_params = compiler.compile(recipe)
+        return (self.template % {'query': query_sql, 'recipe': recipe_sql},
+                (*query_params, *recipe_params))
+
+
+def search_recipes(queryset, query):
+    """Фильтрует рецепты по запросу и сортирует по релевантности"""
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(normalize(query), config='russian',
+                                   search_type='websearch')
+        documents = RecipeSearchDocument.objects.annotate(
+            search_vector=RawSQL('search_vector', [],
+                                 output_field=SearchVectorField()),
+        ).filter(search_vector=search_query)
+        matches = documents.values('recipe_id')
+        rank = Subquery(documents.filter(recipe=OuterRef('pk')).annotate(
+            rank=SearchRank(F('search_vector'), search_query),
+        ).values('rank'))
+    elif connection.vendor == 'sqlite':
+        words = re.findall(r'\w+', normalize(query))
+        if not words:
+            return queryset.none()
+        match = ' '.join(f'"{word}"*' for word in words)
+        matches = RawSQL(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+            (match,))
+        rank = FTSRank(match, F('pk'))
+    else:
+        return queryset.filter(
+            Q(search_document__title__icontains=query)
+            | Q(search_document__body__icontains=query))
+    return queryset.filter(pk__in=matches).annotate(
+        search_rank=rank).order_by('-search_rank', '-pub_date')
@@ -0,0 +1,196 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import (Favorite, Follow, Recipe, RecipeIngredient,
+                     ShoppingCart, ShoppingCartIngredient)
+
+User = get_user_model()
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'following'),
+)
+
+
+def get_recipe_amounts(recipe):
+    """Количество каждого ингредиента рецепта: {ingredient_id: amount}"""
+    return dict(RecipeIngredient.objects.filter(recipe=recipe).
+                values_list('ingredient_id', 'amount'))
+
+
+def set_recipe_ingredients(recipe, amounts):
+    """Приводит ингредиенты рецепта к amounts {ingredient_id: amount}.
+
+    Вставляет, обновляет и удаляет только отличающиеся строки.
+    Возвращает прежние количества в том же формате.
+    """
+    current = {row.ingredient_id: row
+               for row in recipe.ingredients_in_recipe.all()}
+    old_amounts = {ingredient_id: row.amount
+                   for ingredient_id, row in current.items()}
+    to_update = []
+    for ingredient_id, row in current.items():
+        amount = amounts.get(ingredient_id)
+        if amount is not None and amount != row.amount:
+            row.amount = amount
+            to_update.append(row)
+    to_delete = [row.pk for ingredient_id, row in current.items()
+                 if ingredient_id not in amounts]
+    to_create = [RecipeIngredient(recipe=recipe,
+                                  ingredient_id=ingredient_id,
+                                  amount=amount)
+                 for ingredient_id, amount in amounts.items()
+                 if ingredient_id not in current]
+    if to_delete:
+        RecipeIngredient.objects.filter(pk__in=to_delete).delete()
+    if to_update:
+        RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+    if to_create:
+        RecipeIngredient.objects.bulk_create(to_create)
+    return old_amounts
+
+
+def set_recipe_tags(recipe, tag_ids):
+    """Добавляет и удаляет только изменившиеся тэги рецепта"""
+    current = {tag.pk for tag in recipe.tags.all()}
+    tag_ids = set(tag_ids)
+    if current - tag_ids:
+        recipe.tags.remove(*(current - tag_ids))
+    if tag_ids - current:
+        recipe.tags.add(*(tag_ids - current))
+    return current
+
+
+def get_shopping_cart_totals():
+    """Суммы ингредиентов по Спискам покупок, посчитанные по рецептам"""
+    return (RecipeIngredient.objects.
+            filter(recipe__in_shoppingcart_for_users__isnull=False).
+            values_list('recipe__in_shoppingcart_for_users__user',
+                        'ingredient').
+            annotate(total_amount=Sum('amount')).
+            order_by())
+
+
+@transaction.atomic
+def apply_shopping_cart_delta(user_ids, delta):
+    """Прибавляет delta {ingredient_id: amount} к Спискам покупок users.
+
+    Строки с нулевым количеством удаляются. Пользователи блокируются,
+    чтобы параллельные изменения одного Списка покупок не теряли суммы.
+    """
+    delta = {ingredient_id: amount
+             for ingredient_id, amount in delta.items() if amount}
+    user_ids = list(User.objects.select_for_update().
+                    filter(pk__in=user_ids).
+                    order_by('pk').
+                    values_list('pk', flat=True))
+    if not delta or not user_ids:
+        return
+    rows = {
+        (row.user_id, row.ingredient_id): row
+        for row in ShoppingCartIngredient.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=delta)
+    }
+    to_create, to_update, to_delete = [], [], []
+    for user_id in user_ids:
+        for ingredient_id, amount in delta.items():
+            row = rows.get((user_id, ingredient_id))
+            if row is None:
+                if amount > 0:
+                    to_create.append(ShoppingCartIngredient(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        total_amount=amount))
+                continue
+            row.total_amount += amount
+            if row.total_amount > 0:
+                to_update.append(row)
+            else:
+                to_delete.append(row.pk)
+    ShoppingCartIngredient.objects.bulk_create(to_create)
+    ShoppingCartIngredient.objects.bulk_update(to_update, ['total_amount'])
+    ShoppingCartIngredient.objects.filter(pk__in=to_delete).delete()
+
+
+def add_recipe_to_shopping_cart(user_id, recipe_id):
+    apply_shopping_cart_delta([user_id], get_recipe_amounts(recipe_id))
+
+
+def remove_recipe_from_shopping_cart(user_id, recipe_id):
+    amounts = get_recipe_amounts(recipe_id)
+    apply_shopping_cart_delta(
+        [user_id],
+        {ingredient_id: -amount for ingredient_id, amount in amounts.items()})
+
+
+def update_recipe_in_shopping_carts(recipe, old_amounts, new_amounts):
+    """Переносит изменение ингредиентов рецепта в Списки покупок"""
+    delta = {
+        ingredient_id: (new_amounts.get(ingredient_id, 0)
+                        - old_amounts.get(ingredient_id, 0))
+        for ingredient_id in old_amounts.keys() | new_amounts.keys()
+    }
+    if not any(delta.values()):
+        return
+    user_ids = ShoppingCart.objects.filter(recipe=recipe).values_list(
+        'user_id', flat=True)
+    apply_shopping_cart_delta(user_ids, delta)
+
+
+@transaction.atomic
+def rebuild_shopping_cart_ingredients(batch_size=1000):
+    """Пересобирает таблицу ShoppingCartIngredient с нуля"""
+    ShoppingCartIngredient.objects.all().delete()
+    batch = []
+    created = 0
+    for user_id, ingredient_id, total_amount in (
+            get_shopping_cart_totals().iterator()):
+        batch.append(ShoppingCartIngredient(user_id=user_id,
+                                            ingredient_id=ingredient_id,
+                                            total_amount=total_amount))
+        if len(batch) >= batch_size:
+            ShoppingCartIngredient.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    ShoppingCartIngredient.objects.bulk_create(batch)
+    return created + len(batch)
+
+
+def change_counter(model, pk, counter, delta):
+    """Атомарно меняет счетчик строки на delta, не уходя ниже нуля"""
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{counter}__gte': -delta})
+    queryset.update(**{counter: F(counter) + delta})
+
+
+def count_related(related_model, field):
+    return Coalesce(Subquery(
+        related_model.objects.filter(**{field: OuterRef('pk')}).
+        order_by().
+        values(field).
+        annotate(total=Count('pk')).
+        values('total')), 0)
+
+
+def reconcile_counters(batch_size=1000, dry_run=False):
+    """Сверяет счетчики со связанными строками и исправляет расхождения.
+
+    Возвращает количество исправленных строк по каждому счетчику.
+    """
+    drift = {}
+    for model, counter, related_model, field in COUNTERS:
+        rows = (model.objects.
+                annotate(actual=count_related(related_model, field)).
+                exclude(**{counter: F('actual')}).
+                values_list('pk', 'actual'))
+        changed = [model(pk=pk, **{counter: actual})
+                   for pk, actual in rows.iterator()]
+        if not dry_run:
+            model.objects.bulk_update(changed, [counter],
+                                      batch_size=batch_size)
+        drift[f'{model.__name__}.{counter}'] = len(changed)
+    return drift
@@ -0,0 +1,129 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .feed import (add_author_to_all_feeds, add_author_to_feed,
+                   fan_out_recipe, remove_author_from_feed)
+from .models import (Favorite, Follow, Ingredient, Recipe, RecipeScore,
+                     RecipeSimilarity, ShoppingCart)
+from .search import refresh_search_documents
+from .similarity import schedule_similarity_refresh
+from .services import (add_recipe_to_shopping_cart, change_counter,
+                       remove_recipe_from_shopping_cart)
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_cart_recipe_ingredients(sender, instance, created, **kwargs):
+    """Прибавляет ингредиенты рецепта к Списку покупок"""
+    if created:
+        add_recipe_to_shopping_cart(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_cart_recipe_ingredients(sender, instance, **kwargs):
+    """Вычитает ингредиенты рецепта из Списка покупок.
+
+    pre_delete, а не post_delete: при удалении рецепта его ингредиенты
+    удаляются каскадом вместе со строками Списка покупок.
+    """
+    remove_recipe_from_shopping_cart(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_save, sender=Ingredient)
+def refresh_ingredient_recipes_search(sender, instance, created, **kwargs):
+    """Обновляет поиск по рецептам с переименованным ингредиентом"""
+    if not created:
+        refresh_search_documents(
+            instance.recipes_from_ingredient.values_list('recipe_id',
+                                                         flat=True))
+
+
+@receiver(pre_delete, sender=Recipe)
+def refresh_similar_to_deleted_recipe(sender, instance, **kwargs):
+    """Пересчитывает соседей рецептов, у которых был удаляемый рецепт.
+
+    pre_delete, а не post_delete: строки RecipeSimilarity удаляются
+    каскадом раньше, чем приходит post_delete рецепта.
+    """
+    schedule_similarity_refresh(RecipeSimilarity.objects.filter(
+        similar=instance).values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=Recipe)
+def create_recipe_score(sender, instance, created, **kwargs):
+    """Заводит нулевые оценки нового рецепта"""
+    if created:
+        RecipeScore.objects.create(recipe=instance,
+                                   pub_date=instance.pub_date)
+
+
+@receiver(post_save, sender=Recipe)
+def increment_author_recipes_count(sender, instance, created, **kwargs):
+    """Увеличивает счетчик рецептов автора"""
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_author_recipes_count(sender, instance, **kwargs):
+    """Уменьшает счетчик рецептов автора"""
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Favorite)
+def increment_favorites_count(sender, instance, created, **kwargs):
+    """Увеличивает счетчик добавлений в Избранное"""
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def decrement_favorites_count(sender, instance, **kwargs):
+    """Уменьшает счетчик добавлений в Избранное"""
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+def increment_followers_count(sender, instance, created, **kwargs):
+    """Увеличивает счетчик подписчиков автора"""
+    if created:
+        change_counter(User, instance.following_id, 'followers_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def decrement_followers_count(sender, instance, **kwargs):
+    """Уменьшает счетчик подписчиков автора.
+
+    Если подписчиков стало FEED_FANOUT_LIMIT, рецепты автора снова
+    рассылаются, и его последние рецепты раскладываются по лентам.
+    """
+    author_id = instance.following_id
+    change_counter(User, author_id, 'followers_count', -1)
+    if User.objects.filter(
+            pk=author_id,
+            followers_count=settings.FEED_FANOUT_LIMIT).exists():
+        transaction.on_commit(lambda: add_author_to_all_feeds(author_id))
+
+
+@receiver(post_save, sender=Recipe)
+def add_recipe_to_feeds(sender, instance, created, **kwargs):
+    """Рассылает новый рецепт в ленты подписчиков автора"""
+    if created:
+        fan_out_recipe(instance)
+
+
+@receiver(post_save, sender=Follow)
+def add_following_to_feed(sender, instance, created, **kwargs):
+    """Добавляет рецепты автора в ленту нового подписчика"""
+    if created:
+        add_author_to_feed(instance.user_id, instance.following)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_following_from_feed(sender, instance, **kwargs):
+    """Убирает рецепты автора из ленты отписавшегося"""
+    remove_author_from_feed(instance.user_id, instance.following_id)
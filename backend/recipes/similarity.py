@@ -0,0 +1,206 @@
+import threading
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef
+from scipy import sparse
+
+from .models import Recipe, RecipeIngredient, RecipeSimilarity
+from .workers import submit_on_commit
+
+BATCH_SIZE = 1000
+CHUNK_SIZE = 1000
+# В небольшом каталоге частые ингредиенты не отбрасываются.
+MIN_DF_LIMIT = 100
+
+refresh_lock = threading.Lock()
+
+
+def get_df_limit(total, max_df=None):
+    """Сколько рецептов может содержать ингредиент, чтобы учитываться"""
+    if max_df is None:
+        max_df = settings.SIMILAR_RECIPES_MAX_DF
+    return max(max_df * total, MIN_DF_LIMIT)
+
+
+def build_matrix(pairs, document_frequency=None, total=None, max_df=None):
+    """Строит матрицу рецепт x ингредиент с весами TF-IDF.
+
+    pairs - массив (recipe_id, ingredient_id). Строки нормированы,
+    поэтому произведение строк - косинусная близость. Частоты
+    ингредиентов и число рецептов по умолчанию считаются по pairs.
+    Ингредиенты, которые есть больше чем в доле max_df рецептов
+    (соль, вода), получают нулевой вес: они не делают рецепты похожими,
+    а матрицу близостей делают почти плотной.
+    Возвращает (id рецептов по строкам, id ингредиентов, матрица).
+    """
+    pairs = np.asarray(pairs, dtype=np.int64).reshape(-1, 2)
+    recipe_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+    ingredient_ids, columns = np.unique(pairs[:, 1], return_inverse=True)
+    if document_frequency is None:
+        document_frequency = np.bincount(columns,
+                                         minlength=len(ingredient_ids))
+        total = len(recipe_ids)
+    document_frequency = np.asarray(document_frequency)
+    idf = np.log((1 + total) / (1 + document_frequency)) + 1
+    idf[document_frequency > get_df_limit(total, max_df)] = 0
+    matrix = sparse.csr_matrix(
+        (idf[columns], (rows.ravel(), columns.ravel())),
+        shape=(len(recipe_ids), len(ingredient_ids)))
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    matrix = sparse.diags(1 / norms) @ matrix
+    matrix.eliminate_zeros()
+    return recipe_ids, ingredient_ids, matrix.tocsr()
+
+
+def iter_neighbours(matrix, rows, k, chunk_size=CHUNK_SIZE, transposed=None):
+    """Для каждой строки из rows отдает (строка, соседи, близости).
+
+    Соседи - не больше k других строк matrix с ненулевой близостью,
+    по убыванию близости. Считается пачками строк по chunk_size.
+    """
+    if transposed is None:
+        transposed = matrix.T.tocsr()
+    rows = np.asarray(rows)
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        scores = (matrix[chunk] @ transposed).tocsr()
+        for position, row in enumerate(chunk):
+            begin, end = scores.indptr[position], scores.indptr[position + 1]
+            neighbours = scores.indices[begin:end]
+            values = scores.data[begin:end]
+            keep = neighbours != row
+            neighbours, values = neighbours[keep], values[keep]
+            if k is not None and len(values) > k:
+                best = np.argpartition(-values, k)[:k]
+                neighbours, values = neighbours[best], values[best]
+            order = np.lexsort((neighbours, -values))
+            yield row, neighbours[order], values[order]
+
+
+def load_pairs(queryset):
+    return np.fromiter(
+        (value for pair in queryset.values_list(
+            'recipe_id', 'ingredient_id').iterator(chunk_size=10000)
+         for value in pair),
+        dtype=np.int64).reshape(-1, 2)
+
+
+def to_rows(recipe_ids, row, neighbours, values):
+    return [RecipeSimilarity(recipe_id=int(recipe_ids[row]),
+                             similar_id=int(recipe_ids[neighbour]),
+                             score=round(float(value), 6))
+            for neighbour, value in zip(neighbours, values)]
+
+
+@transaction.atomic
+def build_similarities(k=None, chunk_size=CHUNK_SIZE):
+    """Пересчитывает top-K похожих рецептов для всего каталога"""
+    k = k or settings.SIMILAR_RECIPES_TOP_K
+    RecipeSimilarity.objects.all().delete()
+    pairs = load_pairs(RecipeIngredient.objects.all())
+    if not len(pairs):
+        return 0
+    recipe_ids, _, matrix = build_matrix(pairs)
+    batch = []
+    created = 0
+    for row, neighbours, values in iter_neighbours(
+            matrix, np.arange(len(recipe_ids)), k, chunk_size):
+        batch += to_rows(recipe_ids, row, neighbours, values)
+        if len(batch) >= BATCH_SIZE:
+            RecipeSimilarity.objects.bulk_create(batch)
+            created += len(batch)
+            batch = []
+    RecipeSimilarity.objects.bulk_create(batch)
+    return created + len(batch)
+
+
+@transaction.atomic
+def refresh_similarities(recipe_ids, k=None):
+    """Обновляет соседей после изменения ингредиентов рецептов.
+
+    Для измененных рецептов и рецептов, у которых они были в соседях,
+    соседи пересчитываются заново, но только среди рецептов с общими
+    ингредиентами. Остальным рецептам измененный рецепт добавляется,
+    если он ближе их текущего k-го соседа.
+    """
+    k = k or settings.SIMILAR_RECIPES_TOP_K
+    changed = set(recipe_ids)
+    targets = changed | set(RecipeSimilarity.objects.filter(
+        similar_id__in=changed).values_list('recipe_id', flat=True))
+    RecipeSimilarity.objects.filter(recipe_id__in=targets).delete()
+    total = Recipe.objects.filter(Exists(RecipeIngredient.objects.filter(
+        recipe=OuterRef('pk')))).count()
+    rare = RecipeIngredient.objects.filter(
+        ingredient__in=RecipeIngredient.objects.filter(
+            recipe_id__in=targets).values('ingredient')).values(
+                'ingredient').annotate(total=Count('pk')).order_by().filter(
+                    total__lte=get_df_limit(total)).values('ingredient')
+    shared = RecipeIngredient.objects.filter(
+        ingredient__in=rare).values('recipe')
+    pairs = load_pairs(RecipeIngredient.objects.filter(recipe__in=shared))
+    if not len(pairs):
+        return
+    frequency = dict(RecipeIngredient.objects.filter(
+        ingredient_id__in=set(pairs[:, 1].tolist())).values(
+            'ingredient').annotate(total=Count('pk')).order_by().values_list(
+                'ingredient', 'total'))
+    ingredient_ids = np.unique(pairs[:, 1])
+    recipe_ids, _, matrix = build_matrix(
+        pairs, [frequency.get(int(pk), 0) for pk in ingredient_ids], total)
+    index = {int(pk): row for row, pk in enumerate(recipe_ids)}
+    rows = [index[pk] for pk in targets if pk in index]
+    created = []
+    for row, neighbours, values in iter_neighbours(matrix, rows, k):
+        created += to_rows(recipe_ids, row, neighbours, values)
+    RecipeSimilarity.objects.bulk_create(created, batch_size=BATCH_SIZE)
+    insert_into_neighbours(
+        recipe_ids, iter_neighbours(
+            matrix, [index[pk] for pk in changed if pk in index], None),
+        targets, k)
+
+
+def insert_into_neighbours(recipe_ids, changed_rows, targets, k):
+    """Добавляет измененные рецепты в чужие top-K, если они ближе"""
+    offers = {}
+    for row, neighbours, values in changed_rows:
+        for neighbour, value in zip(neighbours, values):
+            recipe_id = int(recipe_ids[neighbour])
+            if recipe_id not in targets:
+                offers.setdefault(recipe_id, []).append(
+                    (float(value), int(recipe_ids[row])))
+    current = {}
+    for similarity in RecipeSimilarity.objects.filter(recipe_id__in=offers):
+        current.setdefault(similarity.recipe_id, []).append(similarity)
+    to_create, to_delete = [], []
+    for recipe_id, candidates in offers.items():
+        existing = current.get(recipe_id, [])
+        ranked = sorted(
+            [(similarity.score, similarity.similar_id, similarity)
+             for similarity in existing]
+            + [(score, similar_id, None) for score, similar_id in candidates],
+            key=lambda item: (-item[0], item[1]))
+        for score, similar_id, similarity in ranked[:k]:
+            if similarity is None:
+                to_create.append(RecipeSimilarity(
+                    recipe_id=recipe_id, similar_id=similar_id,
+                    score=round(score, 6)))
+        to_delete += [similarity.pk for _, _, similarity in ranked[k:]
+                      if similarity is not None]
+    RecipeSimilarity.objects.filter(pk__in=to_delete).delete()
+    RecipeSimilarity.objects.bulk_create(to_create, batch_size=BATCH_SIZE)
+
+
+def run_similarity_refresh(recipe_ids):
+    # Пересчеты с общими рецептами не должны писать строки одновременно.
+    with refresh_lock:
+        refresh_similarities(recipe_ids)
+
+
+def schedule_similarity_refresh(recipe_ids):
+    """Ставит обновление похожих рецептов в пул после коммита"""
+    recipe_ids = list(recipe_ids)
+    if recipe_ids:
+        submit_on_commit(run_similarity_refresh, recipe_ids)
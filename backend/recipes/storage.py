@@ -0,0 +1,38 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, именующее файлы по sha256 содержимого.
+
+    Файл сохраняется как <папка>/<2 символа хэша>/<хэш>.<расширение>;
+    если такой файл уже есть, повторной записи не происходит. Имя
+    меняется только вместе с содержимым, поэтому файлы можно отдавать
+    с неограниченным сроком кэширования. Повторная запись обновляет
+    время изменения файла, чтобы media_gc не удалил его, пока
+    ссылающийся рецепт еще не сохранен.
+    """
+
+    def get_hashed_name(self, name, content):
+        sha256 = hashlib.sha256()
+        content.seek(0)
+        for chunk in iter(lambda: content.read(HASH_CHUNK_SIZE), b''):
+            sha256.update(chunk)
+        content.seek(0)
+        digest = sha256.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(os.path.dirname(name), digest[:2],
+                            digest + extension)
+
+    def _save(self, name, content):
+        name = self.get_hashed_name(name, content)
+        if self.exists(name):
+            os.utime(self.path(name))
+            return name
+        return super()._save(name, content)
@@ -0,0 +1,228 @@
+import csv
+import json
+import os
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .feed import fan_out_recipes
+from .models import (Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+                     Tag)
+from .scores import create_missing_scores
+from .search import refresh_search_documents
+from .services import change_counter, update_recipe_in_shopping_carts
+
+User = get_user_model()
+
+FORMATS = ('jsonl', 'csv')
+CSV_FIELDS = ('author', 'name', 'text', 'cooking_time', 'image', 'tags',
+              'ingredients')
+RECIPE_FIELDS = ('text', 'cooking_time', 'image')
+
+
+def get_format(path, file_format=None):
+    """Формат файла: из параметра или по расширению, по умолчанию jsonl"""
+    if file_format:
+        return file_format
+    extension = os.path.splitext(path)[1].lstrip('.').lower()
+    return 'csv' if extension == 'csv' else 'jsonl'
+
+
+def read_records(file, file_format):
+    """Построчно отдает сырые записи: строки JSON Lines или строки CSV.
+
+    Разбор - в parse_record(), чтобы ошибка в одной строке не обрывала
+    чтение файла.
+    """
+    if file_format == 'csv':
+        yield from csv.DictReader(file)
+        return
+    for line in file:
+        if line.strip():
+            yield line
+
+
+def parse_record(raw, file_format):
+    """Словарь рецепта из сырой записи, бросает ValueError и TypeError"""
+    if file_format == 'csv':
+        return {**raw,
+                'cooking_time': int(raw['cooking_time']),
+                'tags': json.loads(raw['tags'] or '[]'),
+                'ingredients': json.loads(raw['ingredients'] or '[]')}
+    return json.loads(raw)
+
+
+class RecordWriter:
+    """Построчная запись рецептов в JSON Lines или CSV"""
+
+    def __init__(self, file, file_format):
+        self.file = file
+        self.file_format = file_format
+        if file_format == 'csv':
+            self.writer = csv.DictWriter(file, CSV_FIELDS)
+            self.writer.writeheader()
+
+    def write(self, record):
+        if self.file_format == 'csv':
+            self.writer.writerow({
+                **record,
+                'tags': json.dumps(record['tags'], ensure_ascii=False),
+                'ingredients': json.dumps(record['ingredients'],
+                                          ensure_ascii=False)})
+        else:
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+def export_records(batch_size=1000):
+    """Отдает рецепты словарями, читая базу пачками по первичному ключу"""
+    recipes = Recipe.objects.select_related('author').prefetch_related(
+        'tags',
+        Prefetch('ingredients_in_recipe',
+                 RecipeIngredient.objects.select_related('ingredient')),
+    ).order_by('pk')
+    last_pk = 0
+    while True:
+        batch = list(recipes.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return
+        for recipe in batch:
+            yield {
+                'author': recipe.author.username,
+                'name': recipe.name,
+                'text': recipe.text,
+                'cooking_time': recipe.cooking_time,
+                'image': recipe.image.name,
+                'tags': [tag.slug for tag in recipe.tags.all()],
+                'ingredients': [
+                    {'name': row.ingredient.name,
+                     'measurement_unit': row.ingredient.measurement_unit,
+                     'amount': row.amount}
+                    for row in recipe.ingredients_in_recipe.all()],
+            }
+        last_pk = batch[-1].pk
+
+
+class RecipeImporter:
+    """Загружает рецепты пачками с обновлением по (автор, название).
+
+    Авторы, тэги и ингредиенты ищутся в словарях, загруженных один раз.
+    Существующие рецепты обновляются, их ингредиенты и тэги заменяются.
+    """
+
+    def __init__(self, file_format='jsonl'):
+        self.file_format = file_format
+        self.authors = dict(User.objects.values_list('username', 'pk'))
+        self.tags = dict(Tag.objects.values_list('slug', 'pk'))
+        self.ingredients = {
+            (name, measurement_unit): pk
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'pk', 'name', 'measurement_unit')
+        }
+        self.changed_ids = set()
+
+    def resolve(self, raw):
+        """Возвращает (рецепт, тэги, ингредиенты) по сырой записи.
+
+        Значения проверяются валидаторами полей моделей. Бросает
+        KeyError, TypeError или ValueError, если запись не разбирается,
+        не проходит проверку или ссылается на неизвестные объекты.
+        """
+        record = parse_record(raw, self.file_format)
+        recipe = Recipe(
+            author_id=self.authors[record['author']],
+            name=record['name'],
+            text=record['text'],
+            cooking_time=record['cooking_time'],
+            image=record.get('image') or '',
+        )
+        for field in ('tags', 'ingredients'):
+            if not isinstance(record[field], list):
+                raise ValueError(f'{field}: ожидается список')
+        try:
+            recipe.full_clean(exclude=['author', 'image'],
+                              validate_unique=False)
+            tag_ids = {self.tags[slug] for slug in record['tags']}
+            amounts = {}
+            for ingredient in record['ingredients']:
+                ingredient_id = self.ingredients[(
+                    ingredient['name'], ingredient['measurement_unit'])]
+                row = RecipeIngredient(amount=ingredient['amount'])
+                row.clean_fields(exclude=['recipe', 'ingredient'])
+                amounts[ingredient_id] = row.amount
+        except ValidationError as error:
+            raise ValueError(error.messages) from error
+        return recipe, tag_ids, amounts
+
+    def get_existing(self, keys):
+        author_ids = {author_id for author_id, _ in keys}
+        names = {name for _, name in keys}
+        return {
+            (recipe.author_id, recipe.name): recipe
+            for recipe in Recipe.objects.filter(author_id__in=author_ids,
+                                                name__in=names)
+            if (recipe.author_id, recipe.name) in keys
+        }
+
+    @transaction.atomic
+    def import_batch(self, resolved):
+        """Записывает пачку, возвращает (создано, обновлено)"""
+        resolved = {(recipe.author_id, recipe.name): (recipe, tags, amounts)
+                    for recipe, tags, amounts in resolved}
+        existing = self.get_existing(resolved.keys())
+        to_update = []
+        for key, recipe in existing.items():
+            for field in RECIPE_FIELDS:
+                setattr(recipe, field, getattr(resolved[key][0], field))
+            recipe.updated_at = timezone.now()
+            to_update.append(recipe)
+        Recipe.objects.bulk_update(to_update, RECIPE_FIELDS + ('updated_at',))
+        Recipe.objects.bulk_create(
+            recipe for key, (recipe, _, _) in resolved.items()
+            if key not in existing)
+        recipe_ids = {key: recipe.pk for key, recipe in
+                      self.get_existing(resolved.keys()).items()}
+        updated_ids = [recipe.pk for recipe in to_update]
+        created_ids = [recipe_ids[key] for key in resolved
+                       if key not in existing]
+        old_amounts = self.get_amounts_in_carts(updated_ids)
+        RecipeIngredient.objects.filter(recipe_id__in=updated_ids).delete()
+        Recipe.tags.through.objects.filter(
+            recipe_id__in=updated_ids).delete()
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe_id=recipe_ids[key],
+                             ingredient_id=ingredient_id,
+                             amount=amount)
+            for key, (_, _, amounts) in resolved.items()
+            for ingredient_id, amount in amounts.items())
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe_ids[key], tag_id=tag_id)
+            for key, (_, tags, _) in resolved.items()
+            for tag_id in tags)
+        refresh_search_documents(recipe_ids.values())
+        create_missing_scores(created_ids)
+        for recipe in to_update:
+            if recipe.pk in old_amounts:
+                update_recipe_in_shopping_carts(
+                    recipe, old_amounts[recipe.pk],
+                    resolved[(recipe.author_id, recipe.name)][2])
+        for author_id, count in Counter(
+                resolved[key][0].author_id for key in resolved
+                if key not in existing).items():
+            change_counter(User, author_id, 'recipes_count', count)
+        fan_out_recipes(created_ids)
+        self.changed_ids.update(recipe_ids.values())
+        return len(created_ids), len(to_update)
+
+    def get_amounts_in_carts(self, recipe_ids):
+        """Ингредиенты рецептов из Списков покупок до их замены"""
+        amounts = {recipe_id: {} for recipe_id in ShoppingCart.objects.filter(
+            recipe_id__in=recipe_ids).values_list('recipe_id', flat=True)}
+        for recipe_id, ingredient_id, amount in (
+                RecipeIngredient.objects.filter(recipe_id__in=amounts).
+                values_list('recipe_id', 'ingredient_id', 'amount')):
+            amounts[recipe_id][ingredient_id] = amount
+        return amounts
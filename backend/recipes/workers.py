@@ -0,0 +1,27 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+executor = ThreadPoolExecutor(max_workers=settings.BACKGROUND_WORKERS,
+                              thread_name_prefix='recipes-worker')
+
+
+def run_task(func, *args):
+    """Выполняет задачу в потоке пула со своим соединением с БД"""
+    close_old_connections()
+    try:
+        func(*args)
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась ошибкой',
+                         func.__name__)
+    finally:
+        connection.close()
+
+
+def submit_on_commit(func, *args):
+    """Ставит задачу в пул после коммита транзакции"""
+    transaction.on_commit(lambda: executor.submit(run_task, func, *args))
@@ -5,7 +5,8 @@ from users.models import User
 
 
 class CustomUserAdmin(UserAdmin):
-    list_display = ('pk', 'username', 'email', 'first_name', 'last_name',)
+    list_display = ('pk', 'username', 'email', 'first_name', 'last_name',
+                    'recipes_count', 'followers_count',)
 
 
 admin.site.register(User, CustomUserAdmin)
@@ -12,6 +12,16 @@ class User(AbstractUser):
                                 max_length=150,
                                 unique=True,
                                 validators=[validate_username_not_me])
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество рецептов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество подписчиков',
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username',